@@ -3,9 +3,10 @@ import shutil
 import torch
 import time
 from transformers import AutoTokenizer, AutoModelForQuestionAnswering
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from static_assets import StaticAssets
 
 # Load tokenizer and model
 tokenizer = AutoTokenizer.from_pretrained("bert-large-uncased-whole-word-masking-finetuned-squad")
@@ -54,8 +55,7 @@ app.add_middleware(
 # Initialize context
 context = ""
 
-@app.get("/", response_class=HTMLResponse)
-async def get_root():
+def index_page():
     return """
     <!DOCTYPE html>
     <html lang="en">
@@ -199,6 +199,14 @@ async def get_root():
     </html>
     """
 
+# The page is compressed once and revalidated with its ETag instead of being re-sent
+static_assets = StaticAssets()
+static_assets.add_page("index.html", index_page())
+
+@app.get("/", response_class=HTMLResponse)
+async def get_root(request: Request):
+    return static_assets.response(request, "index.html")
+
 @app.post("/upload-video/", response_class=JSONResponse)
 async def upload_file(file: UploadFile = File(...), question: str = Form(...)):
     global context
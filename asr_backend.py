@@ -0,0 +1,82 @@
+import logging
+import os
+import time
+from long_audio import plan_shards
+
+# Which engine runs Whisper: "openai-whisper" (PyTorch float32) or "faster-whisper" (CTranslate2)
+ASR_BACKEND = os.environ.get("ASR_BACKEND", "openai-whisper")
+# CTranslate2 weight type on CPU; int8 is the fast path, float32 matches the PyTorch numbers
+ASR_COMPUTE_TYPE = os.environ.get("ASR_COMPUTE_TYPE", "int8")
+ASR_CPU_THREADS = int(os.environ.get("ASR_CPU_THREADS", "0"))
+
+# openai-whisper has no incremental API, so segments are produced window by window
+STREAM_WINDOW_S = 30.0
+SAMPLE_RATE = 16000
+
+# openai-whisper size names that differ in faster-whisper
+FASTER_WHISPER_SIZES = {"large": "large-v3"}
+
+class OpenAIWhisperBackend:
+    name = "openai-whisper"
+
+    def __init__(self, size):
+        import whisper
+        self.size = size
+        self.model = whisper.load_model(size)
+
+    def transcribe(self, audio, language=None, word_timestamps=False):
+        return self.model.transcribe(audio, language=language, word_timestamps=word_timestamps)
+
+    def iter_segments(self, audio, language=None):
+        # Cuts at the quietest point near each window end and carries the previous text as the prompt
+        window_count = max(1, round(len(audio) / SAMPLE_RATE / STREAM_WINDOW_S))
+        prompt = None
+        for start, end, _, _ in plan_shards(audio, window_count, overlap_s=0, min_shard_s=STREAM_WINDOW_S / 2):
+            result = self.model.transcribe(audio[start:end], language=language, initial_prompt=prompt)
+            language = language or result.get("language")
+            for segment in result["segments"]:
+                yield dict(segment, start=segment["start"] + start / SAMPLE_RATE, end=segment["end"] + start / SAMPLE_RATE)
+            prompt = result["text"][-200:] or None
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, size, compute_type=ASR_COMPUTE_TYPE, cpu_threads=ASR_CPU_THREADS):
+        from faster_whisper import WhisperModel
+        self.size = size
+        self.model = WhisperModel(FASTER_WHISPER_SIZES.get(size, size), device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def iter_segments(self, audio, language=None):
+        # CTranslate2 decodes lazily, so each segment is available as soon as it is produced
+        segments, _ = self.model.transcribe(audio, language=language)
+        for segment in segments:
+            yield {"id": segment.id, "start": segment.start, "end": segment.end, "text": segment.text}
+
+    def transcribe(self, audio, language=None, word_timestamps=False):
+        # Same result shape as openai-whisper so callers do not care which backend ran
+        segments, info = self.model.transcribe(audio, language=language, word_timestamps=word_timestamps)
+        result_segments = []
+        for segment in segments:
+            entry = {"id": segment.id, "start": segment.start, "end": segment.end, "text": segment.text}
+            if word_timestamps and segment.words:
+                entry["words"] = [{"word": word.word, "start": word.start, "end": word.end, "probability": word.probability} for word in segment.words]
+            result_segments.append(entry)
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+        }
+
+ASR_BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+def load_asr_backend(size, backend=None):
+    backend = backend or ASR_BACKEND
+    if backend not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR backend {backend!r}, expected one of {', '.join(ASR_BACKENDS)}")
+    start_time = time.time()
+    model = ASR_BACKENDS[backend](size)
+    logging.info(f"Loaded Whisper {size} with {backend} in {time.time() - start_time:.1f} seconds.")
+    return model
@@ -0,0 +1,94 @@
+import argparse
+import gc
+import logging
+import os
+import re
+import time
+from audio_ingest import decode_file, SAMPLE_RATE
+from asr_backend import load_asr_backend, ASR_BACKENDS
+
+# Compare Whisper backends on local fixtures: every audio file in the fixtures directory
+# needs a reference transcript next to it with the same name and a .txt extension.
+# fixtures/ ships one short English clip (asr_sample_en); add your own recordings for real numbers.
+#
+#   python asr_benchmark.py --fixtures fixtures --sizes tiny base large
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".mpeg"}
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_errors(reference, hypothesis):
+    # Word-level Levenshtein distance
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1]
+
+def load_fixtures(fixtures_dir):
+    fixtures = []
+    if not os.path.isdir(fixtures_dir):
+        return fixtures
+    for name in sorted(os.listdir(fixtures_dir)):
+        stem, extension = os.path.splitext(name)
+        reference_path = os.path.join(fixtures_dir, stem + ".txt")
+        if extension.lower() in AUDIO_EXTENSIONS and os.path.exists(reference_path):
+            with open(reference_path, encoding="utf-8") as file:
+                reference = file.read()
+            fixtures.append((name, decode_file(os.path.join(fixtures_dir, name)), reference))
+    return fixtures
+
+def benchmark(backend_name, size, fixtures, language):
+    model = load_asr_backend(size, backend_name)
+    # One untimed pass so lazy initialisation is not billed to the first fixture
+    model.transcribe(fixtures[0][1][:SAMPLE_RATE * 5], language=language)
+
+    audio_seconds = processing_seconds = 0.0
+    errors = reference_words = 0
+    for name, audio, reference in fixtures:
+        start_time = time.perf_counter()
+        result = model.transcribe(audio, language=language)
+        elapsed = time.perf_counter() - start_time
+
+        reference_tokens = normalize_words(reference)
+        fixture_errors = word_errors(reference_tokens, normalize_words(result["text"]))
+        logging.info(f"{backend_name} {size} {name}: {elapsed:.2f}s, WER {fixture_errors / max(1, len(reference_tokens)):.3f}")
+
+        audio_seconds += len(audio) / SAMPLE_RATE
+        processing_seconds += elapsed
+        errors += fixture_errors
+        reference_words += len(reference_tokens)
+
+    del model
+    gc.collect()
+    return processing_seconds / audio_seconds, errors / max(1, reference_words)
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time factor and WER of the Whisper backends")
+    parser.add_argument("--fixtures", default="fixtures")
+    parser.add_argument("--sizes", nargs="+", default=["tiny", "base"])
+    parser.add_argument("--backends", nargs="+", default=list(ASR_BACKENDS), choices=list(ASR_BACKENDS))
+    parser.add_argument("--language", default=None)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No audio files with .txt references found in {args.fixtures}")
+
+    rows = []
+    for size in args.sizes:
+        for backend_name in args.backends:
+            rtf, wer = benchmark(backend_name, size, fixtures, args.language)
+            rows.append((size, backend_name, rtf, wer))
+
+    print(f"\n{'size':<10}{'backend':<18}{'RTF':>8}{'WER':>8}")
+    for size, backend_name, rtf, wer in rows:
+        print(f"{size:<10}{backend_name:<18}{rtf:>8.3f}{wer:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import subprocess
+import threading
+import numpy as np
+
+# Whisper expects 16 kHz mono float32
+SAMPLE_RATE = 16000
+READ_SIZE = 64 * 1024
+# Start with room for a minute of audio and grow by doubling
+INITIAL_SECONDS = 60
+
+class AudioDecodeError(Exception):
+    pass
+
+class PcmBuffer:
+    # Growable preallocated float32 buffer filled from raw f32le bytes
+    def __init__(self, capacity):
+        self.samples = np.empty(capacity, dtype=np.float32)
+        self.length = 0
+        self.remainder = b""
+
+    def write(self, data):
+        data = self.remainder + data
+        usable = len(data) - len(data) % 4
+        self.remainder = data[usable:]
+        if not usable:
+            return
+        chunk = np.frombuffer(data[:usable], dtype="<f4")
+        needed = self.length + len(chunk)
+        if needed > len(self.samples):
+            grown = np.empty(max(needed, 2 * len(self.samples)), dtype=np.float32)
+            grown[:self.length] = self.samples[:self.length]
+            self.samples = grown
+        self.samples[self.length:needed] = chunk
+        self.length = needed
+
+    def array(self):
+        return self.samples[:self.length]
+
+def ffmpeg_args(sample_rate, sample_format="f32le"):
+    return [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", "pipe:0", "-vn",
+        "-f", sample_format, "-ac", "1", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+
+async def decode_upload(upload_file, sample_rate=SAMPLE_RATE):
+    # Streams the upload body through ffmpeg and returns 16 kHz mono float32 samples without touching disk.
+    # Containers that need seeking (e.g. mp4 with a trailing moov atom) cannot be read from a pipe and fail here.
+    process = await asyncio.create_subprocess_exec(
+        *ffmpeg_args(sample_rate),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    buffer = PcmBuffer(INITIAL_SECONDS * sample_rate)
+
+    async def feed():
+        try:
+            while True:
+                chunk = await upload_file.read(READ_SIZE)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg exited early; its stderr explains why
+            pass
+        finally:
+            process.stdin.close()
+
+    async def drain():
+        while True:
+            data = await process.stdout.read(READ_SIZE)
+            if not data:
+                break
+            buffer.write(data)
+
+    _, _, stderr = await asyncio.gather(feed(), drain(), process.stderr.read())
+    return_code = await process.wait()
+    if return_code != 0:
+        message = stderr.decode(errors="replace").strip()
+        logging.error(f"ffmpeg failed to decode upload {getattr(upload_file, 'filename', '')}: {message}")
+        raise AudioDecodeError(message or f"ffmpeg exited with code {return_code}")
+
+    return buffer.array()
+
+def decode_file(path, sample_rate=SAMPLE_RATE):
+    # Blocking counterpart of decode_upload for files already on disk
+    args = ffmpeg_args(sample_rate)
+    args[args.index("pipe:0")] = path
+    process = subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True)
+    if process.returncode != 0:
+        raise AudioDecodeError(process.stderr.decode(errors="replace").strip() or f"ffmpeg exited with code {process.returncode}")
+    return np.frombuffer(process.stdout, dtype="<f4").astype(np.float32)
+
+def iter_pcm_chunks(path, chunk_seconds, sample_rate=SAMPLE_RATE, sample_format="s16le"):
+    # Yields fixed-length raw PCM chunks (the last one shorter) straight from an ffmpeg pipe, so audio is
+    # never written to disk and only one chunk is held here at a time. Works on video files too.
+    sample_width = 4 if sample_format == "f32le" else 2
+    chunk_bytes = int(chunk_seconds * sample_rate) * sample_width
+    args = ffmpeg_args(sample_rate, sample_format)
+    args[args.index("pipe:0")] = path
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr is drained on its own thread: a damaged input can log more than the pipe buffer holds,
+    # and ffmpeg would then block on stderr while we block on stdout
+    stderr = []
+    stderr_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+        if process.wait() != 0:
+            stderr_reader.join()
+            message = b"".join(stderr).decode(errors="replace").strip()
+            raise AudioDecodeError(message or f"ffmpeg exited with code {process.returncode}")
+    finally:
+        # Also reached when the consumer stops early
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_reader.join()
+        process.stdout.close()
+        process.stderr.close()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from translation_engine import load_translator
+from asr_backend import load_asr_backend, ASR_BACKEND
+from audio_ingest import decode_file
+from translation_stage import translate_transcription
+from vad import transcribe_speech_only
+
+# Offline batch transcription driven by a JSONL manifest, one job per line:
+#   {"id": "call-0001", "audio": "recordings/call-0001.mp3", "language": "hi", "translate": true, "vad": false}
+# Only "audio" is required; "id" defaults to the audio path. Results are appended to the output JSONL
+# as they finish, and a rerun with the same output skips every id already written there.
+#
+#   python batch_transcribe.py manifest.jsonl results.jsonl --workers 4 --model-size base
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
+whisper_model = None
+translator = None
+
+# Runs once per worker process
+def load_models(model_size, backend, threads_per_worker):
+    global whisper_model, translator
+    import torch
+    torch.set_num_threads(threads_per_worker)
+
+    whisper_model = load_asr_backend(model_size, backend)
+    translator = load_translator(model_name)
+    logging.info(f"Worker {os.getpid()} loaded its models.")
+
+def process_job(job):
+    start_time = time.time()
+    result = {"id": job["id"], "audio": job["audio"]}
+    try:
+        audio = decode_file(job["audio"])
+        if job.get("vad"):
+            transcription_result = transcribe_speech_only(whisper_model, audio, language=job.get("language"))
+            result["vad"] = transcription_result["vad"]
+        else:
+            transcription_result = whisper_model.transcribe(audio, language=job.get("language"))
+
+        result["text"] = transcription_result["text"].strip()
+        result["segments"] = [{"start": round(segment["start"], 2), "end": round(segment["end"], 2), "text": segment["text"].strip()} for segment in transcription_result.get("segments", [])]
+        if job.get("translate", True):
+            result["translation"] = translate_transcription(translator, transcription_result)
+    except Exception as e:
+        logging.error(f"Job {job['id']} failed: {e}")
+        result["error"] = str(e)
+    result["runtime"] = round(time.time() - start_time, 2)
+    return result
+
+def read_manifest(path):
+    jobs = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if "audio" not in job:
+                raise SystemExit(f"{path}:{line_number}: manifest entries need an \"audio\" path")
+            job.setdefault("id", job["audio"])
+            jobs.append(job)
+    return jobs
+
+def completed_ids(output_path):
+    # The output file is the checkpoint; a line cut off by a kill is dropped so appends stay valid JSONL
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    valid_bytes = 0
+    with open(output_path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes != os.path.getsize(output_path):
+        logging.warning(f"Truncating incomplete tail of {output_path}.")
+        with open(output_path, "r+b") as file:
+            file.truncate(valid_bytes)
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch transcription and translation from a JSONL manifest")
+    parser.add_argument("manifest")
+    parser.add_argument("output")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--model-size", default="base")
+    parser.add_argument("--backend", default=ASR_BACKEND)
+    parser.add_argument("--retry-failed", action="store_true", help="rerun ids whose previous result was an error; the newest line for an id wins")
+    args = parser.parse_args()
+
+    jobs = read_manifest(args.manifest)
+    done = completed_ids(args.output)
+    if args.retry_failed and done:
+        with open(args.output, encoding="utf-8") as file:
+            latest = {entry["id"]: entry for entry in map(json.loads, file)}
+        done -= {job_id for job_id, entry in latest.items() if "error" in entry}
+    pending = [job for job in jobs if job["id"] not in done]
+    logging.info(f"{len(jobs)} jobs in manifest, {len(jobs) - len(pending)} already done, {len(pending)} to run.")
+    if not pending:
+        return
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+    context = multiprocessing.get_context("spawn")
+    start_time = time.time()
+    with context.Pool(args.workers, initializer=load_models, initargs=(args.model_size, args.backend, threads_per_worker)) as pool, \
+            open(args.output, "a", encoding="utf-8") as output:
+        for finished, result in enumerate(pool.imap_unordered(process_job, pending), 1):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+            elapsed = time.time() - start_time
+            logging.info(f"[{finished}/{len(pending)}] {result['id']} {'failed' if 'error' in result else 'done'} ({elapsed / finished:.1f}s per file)")
+
+if __name__ == "__main__":
+    main()
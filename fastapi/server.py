@@ -1,38 +1,61 @@
 import logging
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Request
 from fastapi.responses import HTMLResponse
-import whisper
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 import os
+import sys
+import asyncio
 import uvicorn
 
+# Shared helpers (worker pool, ...) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from worker_pool import WorkerPool, QueueFullError, busy_response
+from audio_ingest import decode_upload, AudioDecodeError
+from asr_backend import load_asr_backend
+from long_audio import is_long_audio, transcribe_sharded
+from streaming_pipeline import pipelined_transcribe_translate
+from translation_stage import translate_transcription
+from translation_engine import load_translator
+from static_assets import StaticAssets
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load Whisper model for transcription
-whisper_model = whisper.load_model("large")
-
-# Setup translation pipeline using Hugging Face's transformers library
 model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-translator = pipeline("translation", model=model, tokenizer=tokenizer)
+whisper_model = None
+translator = None
+
+# Models are loaded once inside each worker process, never in the web process
+def load_models():
+    global whisper_model, translator
+
+    # Load Whisper model for transcription
+    whisper_model = load_asr_backend("large")
+
+    # Setup translation with the configured engine (transformers pipeline or CTranslate2 int8)
+    translator = load_translator(model_name)
+    logging.info(f"Worker {os.getpid()} loaded its models.")
+
+worker_pool = WorkerPool(initializer=load_models)
 
 app = FastAPI()
 
-def transcribe_and_translate(audio_file_path):
-    try:
-        # Transcribe audio using Whisper model
-        transcription_result = whisper_model.transcribe(audio_file_path)
+@app.on_event("startup")
+async def start_workers():
+    await asyncio.to_thread(worker_pool.start)
 
-        # Extract transcription text
-        transcription_text = transcription_result['text']
+@app.on_event("shutdown")
+async def stop_workers():
+    worker_pool.shutdown()
 
-        # Translate from Hindi to English
-        translation_result = translator(transcription_text, max_length=400)
+@app.get("/queue")
+async def queue_stats():
+    return worker_pool.stats()
 
-        # Extract and return translated text
-        translated_text = translation_result[0]['translation_text']
+def transcribe_and_translate(audio):
+    try:
+        # Transcribe with Whisper and translate each segment from Hindi to English while the next is transcribed
+        segments = pipelined_transcribe_translate(whisper_model, translator, audio)
+        translated_text = " ".join(segment["translation"] for segment in segments if segment["translation"])
         
         return translated_text
 
@@ -40,8 +63,14 @@ def transcribe_and_translate(audio_file_path):
         logging.error(f"An error occurred during transcription and translation: {e}")
         return "Transcription and translation failed."
 
-@app.get("/", response_class=HTMLResponse)
-async def get_root():
+def transcribe_shard(audio):
+    # One shard of a long recording; word timestamps let the shards be stitched without duplicates
+    return whisper_model.transcribe(audio, word_timestamps=True)
+
+def translate_result(transcription_result):
+    return translate_transcription(translator, transcription_result)
+
+def index_page():
     return """
     <!DOCTYPE html>
     <html lang="en">
@@ -191,14 +220,32 @@ document.getElementById('clearButton').addEventListener('click', () => {
     </html>
     """
 
+# Page and static files are read and compressed once, then revalidated with ETags
+static_assets = StaticAssets()
+static_assets.add_page("index.html", index_page())
+static_assets.add_directory(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+
+@app.get("/", response_class=HTMLResponse)
+async def get_root(request: Request):
+    return static_assets.response(request, "index.html")
+
 @app.post("/upload")
 async def upload_file(audio_file: UploadFile = File(...)):
     try:
-        audio_file_path = f"{audio_file.filename}"
-        with open(audio_file_path, "wb") as f:
-            f.write(await audio_file.read())
-        
-        translation = transcribe_and_translate(audio_file_path)
+        try:
+            audio = await decode_upload(audio_file)
+        except AudioDecodeError as e:
+            return f"Could not decode audio: {e}"
+
+        try:
+            # Long recordings are split at silences and transcribed by all workers in parallel
+            if is_long_audio(audio):
+                transcription_result = await transcribe_sharded(worker_pool, transcribe_shard, audio)
+                translation = await worker_pool.run(translate_result, transcription_result)
+            else:
+                translation = await worker_pool.run(transcribe_and_translate, audio)
+        except QueueFullError as e:
+            return busy_response(e)
         return translation
 
     except Exception as e:
@@ -206,12 +253,9 @@ async def upload_file(audio_file: UploadFile = File(...)):
         return "An error occurred during transcription and translation."
 
 # Serve static files
-@app.get("/static/{filename}", response_class=HTMLResponse)
-async def static_files(filename: str):
-    static_folder = os.path.join(os.path.dirname(__file__), "static")
-    file_path = os.path.join(static_folder, filename)
-    with open(file_path) as file:
-        return HTMLResponse(file.read())
+@app.get("/static/{filename}")
+async def static_files(request: Request, filename: str):
+    return static_assets.response(request, filename)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
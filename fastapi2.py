@@ -1,52 +1,96 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-import whisper
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from translation_engine import load_translator, TRANSLATION_ENGINE
+from asr_backend import load_asr_backend, ASR_BACKEND
 import os
 import logging
+import asyncio
+from worker_pool import WorkerPool, QueueFullError, busy_response
+from audio_ingest import decode_upload, AudioDecodeError
+from result_cache import ResultCache, upload_digest, cache_key
+from translation_stage import translate_transcription
+from vad import transcribe_speech_only
+from streaming_pipeline import pipelined_transcribe_translate
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load Whisper model for transcription
-whisper_model = whisper.load_model("tiny")  # Or choose a different model size
-
-# Setup translation pipeline using Hugging Face's transformers library
 model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-translator = pipeline("translation", model=model, tokenizer=tokenizer)
+whisper_model_size = "tiny"
+whisper_model = None
+translator = None
+
+# Models are loaded once inside each worker process, never in the web process
+def load_models():
+    global whisper_model, translator
+
+    # Load Whisper model for transcription
+    whisper_model = load_asr_backend(whisper_model_size)  # Or choose a different model size
+
+    # Setup translation with the configured engine (transformers pipeline or CTranslate2 int8)
+    translator = load_translator(model_name)
+    logging.info(f"Worker {os.getpid()} loaded its models.")
+
+worker_pool = WorkerPool(initializer=load_models)
+# Opened on startup so spawned workers re-importing this module do not open it too
+result_cache = None
+
+def transcribe_and_translate(audio, use_vad=False):
+    # Transcribe only the speech regions, then translate from Hindi to English sentence by sentence
+    if use_vad:
+        transcription_result = transcribe_speech_only(whisper_model, audio)
+        return {"translated_text": translate_transcription(translator, transcription_result), "vad": transcription_result["vad"]}
+
+    # Otherwise each Whisper segment is translated while the next one is being transcribed
+    segments = pipelined_transcribe_translate(whisper_model, translator, audio)
+    return {"translated_text": " ".join(segment["translation"] for segment in segments if segment["translation"])}
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def start_workers():
+    global result_cache
+    result_cache = ResultCache()
+    await asyncio.to_thread(worker_pool.start)
+
+@app.on_event("shutdown")
+async def stop_workers():
+    worker_pool.shutdown()
+
+@app.get("/queue")
+async def queue_stats():
+    return {**worker_pool.stats(), "cache": result_cache.stats()}
+
 @app.post("/transcribe_and_translate")
-async def transcribe_translate(audio_file: UploadFile = File(...)):
+async def transcribe_translate(audio_file: UploadFile = File(...), vad: bool = Form(False)):
     try:
         # Validate file type (optional, but recommended for security)
         if audio_file.content_type not in ["audio/mpeg", "audio/wav"]:
             raise HTTPException(status_code=400, detail="Invalid audio file format. Supported formats: MP3, WAV")
 
-        # Save the uploaded audio file temporarily
-        file_path = f"uploads/{audio_file.filename}"  # Adjust path if needed
-        with open(file_path, "wb") as buffer:
-            buffer.write(await audio_file.read())
-
-        # Perform transcription using Whisper model
-        transcription_result = whisper_model.transcribe(file_path)
-
-        # Extract transcription text
-        transcription_text = transcription_result["text"]
-
-        # Translate from Hindi to English
-        translation_result = translator(transcription_text, max_length=400)
+        # Repeat uploads of the same audio are answered from the result cache
+        key = cache_key(await upload_digest(audio_file), whisper_model_size, ASR_BACKEND, model_name, TRANSLATION_ENGINE, "auto", f"vad={vad}")
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
 
-        # Extract and return translated text
-        translated_text = translation_result[0]["translation_text"]
+        # Decode the uploaded audio in memory through ffmpeg
+        try:
+            audio = await decode_upload(audio_file)
+        except AudioDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
 
-        # Clean up the temporary audio file
-        os.remove(file_path)
+        # Transcribe and translate in a worker process
+        try:
+            response = await worker_pool.run(transcribe_and_translate, audio, vad)
+        except QueueFullError as e:
+            return busy_response(e)
 
-        return {"translated_text": translated_text}
+        result_cache.put(key, response)
+        return response
 
+    except HTTPException:
+        # Client errors (bad format, undecodable audio) keep their status code
+        raise
     except Exception as e:
         logging.error(f"An error occurred during transcription and translation: {e}")
         return {"error": "Transcription and translation failed."}
@@ -1,70 +1,123 @@
 import torch
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-import whisper
+import asyncio
+import json
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from translation_engine import load_translator, TRANSLATION_ENGINE
+from asr_backend import load_asr_backend, ASR_BACKEND
 import os
 from pydub import AudioSegment
 import io
 from fastapi.staticfiles import StaticFiles
+from worker_pool import WorkerPool, QueueFullError, StreamError, busy_response
+from audio_ingest import decode_upload, AudioDecodeError
+from result_cache import ResultCache, upload_digest, cache_key
+from translation_stage import translate_transcription
+from vad import transcribe_speech_only
+from long_audio import is_long_audio, transcribe_sharded
+from streaming_pipeline import pipelined_transcribe_translate
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load Whisper model for transcription
-whisper_model = whisper.load_model("tiny")
-
-# Setup translation pipeline using Hugging Face's transformers library
 model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-translator = pipeline("translation", model=model, tokenizer=tokenizer)
+whisper_model_size = "tiny"
+whisper_model = None
+translator = None
+
+# Models are loaded once inside each worker process, never in the web process
+def load_models():
+    global whisper_model, translator
+
+    # Load Whisper model for transcription
+    whisper_model = load_asr_backend(whisper_model_size)
+
+    # Setup translation with the configured engine (transformers pipeline or CTranslate2 int8)
+    translator = load_translator(model_name)
+    logging.info(f"Worker {os.getpid()} loaded its models.")
+
+worker_pool = WorkerPool(initializer=load_models)
+# Opened on startup so spawned workers re-importing this module do not open it too
+result_cache = None
 
 app = FastAPI()
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@app.on_event("startup")
+async def start_workers():
+    global result_cache
+    result_cache = ResultCache()
+    await asyncio.to_thread(worker_pool.start)
 
-def transcribe_and_translate(audio_file_path):
-    try:
-        # Transcribe audio using Whisper model
-        transcription_result = whisper_model.transcribe(audio_file_path)
+@app.on_event("shutdown")
+async def stop_workers():
+    worker_pool.shutdown()
 
-        # Extract transcription text
-        transcription_text = transcription_result['text']
+@app.get("/queue")
+async def queue_stats():
+    return {**worker_pool.stats(), "cache": result_cache.stats()}
 
-        # Translate from Hindi to English
-        translation_result = translator(transcription_text, max_length=400)
+app.mount("/static", StaticFiles(directory="static"), name="static")
 
-        # Extract and return translated text
-        translated_text = translation_result[0]['translation_text']
+def transcribe_and_translate(audio, use_vad=False):
+    try:
+        # Transcribe only the speech regions, then translate from Hindi to English sentence by sentence
+        if use_vad:
+            transcription_result = transcribe_speech_only(whisper_model, audio)
+            return translate_transcription(translator, transcription_result), transcription_result["vad"]
+
+        # Otherwise each Whisper segment is translated while the next one is being transcribed
+        segments = pipelined_transcribe_translate(whisper_model, translator, audio)
+        translated_text = " ".join(segment["translation"] for segment in segments if segment["translation"])
         
-        return translated_text
+        return translated_text, None
 
     except Exception as e:
         logging.error(f"An error occurred during transcription and translation: in{e}")
-        return None
+        return None, None
 
-@app.post("/transcribe-translate/")
-async def transcribe_translate(file: UploadFile = File(...)):
-    try:
-        # Read the uploaded file
-        audio_content = await file.read()
-        audio_file_path = f"{file.filename}"
-        
-        # Save the audio content to a temporary file
-        with open(audio_file_path, "wb") as audio_file:
-            audio_file.write(audio_content)
+def transcribe_shard(audio, use_vad=False):
+    # One shard of a long recording; word timestamps let the shards be stitched without duplicates
+    if use_vad:
+        return transcribe_speech_only(whisper_model, audio, word_timestamps=True)
+    return whisper_model.transcribe(audio, word_timestamps=True)
 
-        # Perform transcription and translation
-        translation = transcribe_and_translate(audio_file_path)
+def translate_result(transcription_result):
+    return translate_transcription(translator, transcription_result)
 
-        # Delete the temporary audio file
-        os.remove(audio_file_path)
+@app.post("/transcribe-translate/")
+async def transcribe_translate(file: UploadFile = File(...), vad: bool = Form(False)):
+    try:
+        # Repeat uploads of the same audio are answered from the result cache
+        key = cache_key(await upload_digest(file), whisper_model_size, ASR_BACKEND, model_name, TRANSLATION_ENGINE, "auto", f"vad={vad}")
+        cached = result_cache.get(key)
+        if cached is not None:
+            return JSONResponse(content=cached, status_code=200)
+
+        # Decode the upload in memory through ffmpeg
+        try:
+            audio = await decode_upload(file)
+        except AudioDecodeError as e:
+            return JSONResponse(content={"detail": f"Could not decode audio: {e}"}, status_code=400)
+
+        # Perform transcription and translation in worker processes; long recordings are sharded across all of them
+        try:
+            if is_long_audio(audio):
+                transcription_result = await transcribe_sharded(worker_pool, transcribe_shard, audio, vad)
+                translation = await worker_pool.run(translate_result, transcription_result)
+                vad_stats = transcription_result.get("vad")
+            else:
+                translation, vad_stats = await worker_pool.run(transcribe_and_translate, audio, vad)
+        except QueueFullError as e:
+            return busy_response(e)
 
         if translation:
             print(translation)
-            return JSONResponse(content={"translation": translation}, status_code=200)
+            content = {"translation": translation}
+            if vad_stats:
+                content["vad"] = vad_stats
+            result_cache.put(key, content)
+            return JSONResponse(content=content, status_code=200)
         else:
             raise HTTPException(status_code=500, detail="Transcription and translation failed.")
 
@@ -72,6 +125,43 @@ async def transcribe_translate(file: UploadFile = File(...)):
         logging.error(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred during transcription and translation.{e} ")
 
+def stream_transcribe_translate(audio):
+    yield from pipelined_transcribe_translate(whisper_model, translator, audio)
+
+@app.post("/transcribe-translate/stream")
+async def transcribe_translate_stream(file: UploadFile = File(...)):
+    # Same work as /transcribe-translate/, but one NDJSON line per segment as soon as it is translated
+    try:
+        audio = await decode_upload(file)
+    except AudioDecodeError as e:
+        return JSONResponse(content={"detail": f"Could not decode audio: {e}"}, status_code=400)
+
+    segments = worker_pool.stream(stream_transcribe_translate, audio)
+    try:
+        # Wait for the first segment so a full queue still becomes a 503 rather than a broken stream
+        first = await segments.__anext__()
+    except QueueFullError as e:
+        return busy_response(e)
+    except StopAsyncIteration:
+        first = None
+    except StreamError as e:
+        return JSONResponse(content={"detail": f"Transcription and translation failed: {e}"}, status_code=500)
+
+    async def lines():
+        if first is None:
+            return
+        try:
+            yield json.dumps(first, ensure_ascii=False) + "\n"
+            async for segment in segments:
+                yield json.dumps(segment, ensure_ascii=False) + "\n"
+        except StreamError as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            # A client that disconnects cancels the worker instead of leaving it to finish the whole file
+            await segments.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,14 +1,22 @@
 from fastapi import FastAPI, UploadFile, File, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
+import logging
 import os
 import tempfile
+import bisect
+from concurrent.futures import ThreadPoolExecutor
 import librosa
 import numpy as np
 from transformers import pipeline
 from pyannote.audio import Pipeline
 import torch
+from speaker_store import SpeakerStore
+from transcript_store import DiarizedTranscript, TranscriptStore
+from audio_ingest import READ_SIZE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Check if GPU is available
 device = 0 if torch.cuda.is_available() else -1
@@ -25,65 +33,302 @@ try:
 except Exception as e:
     raise RuntimeError(f"Error initializing pipelines: {e}")
 
-# Function to transcribe audio segments
-def transcribe_segment(segment_audio, sr):
-    # Convert the segment to the required format
-    segment_audio = librosa.resample(segment_audio, orig_sr=sr, target_sr=16000)
-    segment_audio = segment_audio.astype(np.float32)
+# Enrolled speaker embeddings, matched against every diarization
+speaker_store = SpeakerStore()
+# Recent diarization results, queryable by time window or speaker
+transcript_store = TranscriptStore()
+
+# Whisper works on 16 kHz audio, so the whole file is resampled once up front
+ASR_SAMPLE_RATE = 16000
+# Turns sent through the ASR pipeline per padded batch
+ASR_BATCH_SIZE = int(os.environ.get("ASR_BATCH_SIZE", "16"))
+
+# Function to transcribe many audio segments in length-sorted batches
+def transcribe_segments(segments_audio):
+    # Similar lengths share a batch so little compute is spent on padding; results come back in input order
+    texts = [""] * len(segments_audio)
+    order = sorted((i for i, segment in enumerate(segments_audio) if len(segment)), key=lambda i: len(segments_audio[i]))
+    for start in range(0, len(order), ASR_BATCH_SIZE):
+        batch = order[start:start + ASR_BATCH_SIZE]
+        inputs = [{"raw": segments_audio[i], "sampling_rate": ASR_SAMPLE_RATE} for i in batch]
+        for i, result in zip(batch, asr_pipeline(inputs, batch_size=len(batch))):
+            texts[i] = result["text"]
+    return texts
+
+# Segment planning: same-speaker turns closer than MERGE_GAP_S are merged, turns shorter than
+# MIN_TURN_S are attached to a close same-speaker neighbour, kept on their own next to another speaker
+# or dropped when isolated, and nothing exceeds Whisper's 30 s window
+MERGE_GAP_S = float(os.environ.get("MERGE_GAP_S", "0.5"))
+MIN_TURN_S = float(os.environ.get("MIN_TURN_S", "0.4"))
+MAX_SEGMENT_S = 30.0
+
+def split_long_turns(turns, max_duration):
+    split = []
+    for start, end, speaker in turns:
+        while end - start > max_duration:
+            split.append((start, start + max_duration, speaker))
+            start += max_duration
+        split.append((start, end, speaker))
+    return split
+
+def merge_adjacent(segments, max_gap, max_duration):
+    merged = []
+    for start, end, speaker in segments:
+        if merged:
+            last_start, last_end, last_speaker = merged[-1]
+            if speaker == last_speaker and start - last_end <= max_gap and end - last_start <= max_duration:
+                merged[-1] = (last_start, max(last_end, end), speaker)
+                continue
+        merged.append((start, end, speaker))
+    return merged
+
+def plan_segments(turns, max_gap=MERGE_GAP_S, min_duration=MIN_TURN_S, max_duration=MAX_SEGMENT_S):
+    # Returns ASR segments as (start, end, speaker) plus planning stats
+    merged = merge_adjacent(split_long_turns(sorted(turns), max_duration), max_gap, max_duration)
+
+    planned = []
+    attached = kept_short = dropped = 0
+    for index, (start, end, speaker) in enumerate(merged):
+        if end - start >= min_duration:
+            planned.append((start, end, speaker))
+            continue
+        previous_gap = start - planned[-1][1] if planned else None
+        following = merged[index + 1] if index + 1 < len(merged) else None
+        next_gap = following[0] - end if following else None
+        # A blip only joins a close neighbour of the same speaker (the closer one if both qualify),
+        # so its words are never credited to someone else
+        join_previous = previous_gap is not None and previous_gap <= max_gap and planned[-1][2] == speaker and end - planned[-1][0] <= max_duration
+        join_next = next_gap is not None and next_gap <= max_gap and following[2] == speaker and following[1] - start <= max_duration
+        if join_previous and (not join_next or previous_gap <= next_gap):
+            planned[-1] = (planned[-1][0], max(planned[-1][1], end), speaker)
+            attached += 1
+        elif join_next:
+            merged[index + 1] = (start, following[1], speaker)
+            attached += 1
+        elif (previous_gap is not None and previous_gap <= max_gap) or (next_gap is not None and next_gap <= max_gap):
+            # A short interjection between other speakers keeps its own segment and speaker
+            planned.append((start, end, speaker))
+            kept_short += 1
+        else:
+            dropped += 1
+
+    # Attaching blips can leave same-speaker segments next to each other again
+    planned = merge_adjacent(planned, max_gap, max_duration)
+    stats = {"turns": len(turns), "asr_calls": len(planned), "asr_calls_saved": len(turns) - len(planned), "attached": attached, "kept_short": kept_short, "dropped": dropped}
+    return planned, stats
+
+def diarize(audio, sr):
+    # Run diarization on the already decoded audio (pyannote also works at 16 kHz)
+    diarization, embeddings = diarization_pipeline({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": sr}, return_embeddings=True)
+    turns = [(turn.start, turn.end, speaker) for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    return turns, dict(zip(diarization.labels(), embeddings))
+
+def transcribe_per_segment(audio, sr):
+    # Collect the speaker turns and coalesce them into fewer, fuller ASR segments
+    turns, embeddings = diarize(audio, sr)
+    turns, plan_stats = plan_segments(turns)
+    logging.info(f"Segment plan: {plan_stats}")
+
+    # Transcribe all turns in batches
+    segment_texts = transcribe_segments([audio[int(start * sr):int(end * sr)] for start, end, _ in turns])
+
+    transcripts = [(start, end, speaker, text) for (start, end, speaker), text in zip(turns, segment_texts)]
+    footer = f"ASR calls: {plan_stats['asr_calls']} for {plan_stats['turns']} diarized turns ({plan_stats['asr_calls_saved']} saved)"
+    return transcripts, footer, embeddings
+
+def transcribe_words(audio, sr):
+    # One word-timestamped Whisper pass over the whole file
+    result = asr_pipeline({"raw": audio, "sampling_rate": sr}, return_timestamps="word", chunk_length_s=30, batch_size=ASR_BATCH_SIZE)
+    words = []
+    for chunk in result["chunks"]:
+        start, end = chunk["timestamp"]
+        words.append((start, end if end is not None else start, chunk["text"]))
+    return words
+
+class TurnIndex:
+    # Interval index over possibly overlapping turns: sorted starts plus a running max of end times
+    def __init__(self, turns):
+        self.turns = sorted(turns)
+        self.starts = [start for start, _, _ in self.turns]
+        self.max_ends = []
+        self.max_end_rows = []
+        for row, (_, end, _) in enumerate(self.turns):
+            if not self.max_ends or end > self.max_ends[-1]:
+                self.max_ends.append(end)
+                self.max_end_rows.append(row)
+            else:
+                self.max_ends.append(self.max_ends[-1])
+                self.max_end_rows.append(self.max_end_rows[-1])
 
-    # Perform ASR
-    result = asr_pipeline(segment_audio)
-    return result["text"]
+    def lookup(self, time):
+        last = bisect.bisect_right(self.starts, time) - 1
+        # Only turns from the first whose running max end reaches time can cover it
+        first = bisect.bisect_left(self.max_ends, time)
+        covering = [row for row in range(first, last + 1) if self.turns[row][1] >= time]
+        if covering:
+            # The shortest covering turn wins, so an interjection inside a long turn keeps its speaker
+            return min(covering, key=lambda row: self.turns[row][1] - self.turns[row][0])
+        # Between turns: take whichever boundary is closer
+        before = self.max_end_rows[last] if last >= 0 else None
+        after = last + 1 if last + 1 < len(self.turns) else None
+        if after is None or (before is not None and time - self.turns[before][1] <= self.starts[after] - time):
+            return before
+        return after
 
-def transcribe_and_diarize(audio_file_path, speaker_names):
-    # Load audio file
-    audio, sr = librosa.load(audio_file_path, sr=None)
+def transcribe_aligned(audio, sr):
+    # Diarization and whole-file ASR run at the same time; words are then assigned to speaker turns
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        turns_future = executor.submit(diarize, audio, sr)
+        words_future = executor.submit(transcribe_words, audio, sr)
+        (turns, embeddings), words = turns_future.result(), words_future.result()
 
-    # Run diarization
-    diarization = diarization_pipeline(audio_file_path)
+    if not turns:
+        return [], f"Aligned {len(words)} words to 0 diarized turns", embeddings
 
-    # Create a mapping of speaker segments
-    speaker_segments = {}
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        if speaker not in speaker_segments:
-            speaker_segments[speaker] = []
-        speaker_segments[speaker].append((turn.start, turn.end))
+    index = TurnIndex(turns)
+    transcripts = []
+    current_turn = None
+    for start, end, text in words:
+        turn = index.lookup((start + end) / 2)
+        if turn == current_turn:
+            last_start, _, speaker, last_text = transcripts[-1]
+            transcripts[-1] = (last_start, end, speaker, last_text + text)
+        else:
+            transcripts.append((start, end, index.turns[turn][2], text))
+            current_turn = turn
+    transcripts = [(start, end, speaker, text.strip()) for start, end, speaker, text in transcripts]
+    return transcripts, f"Aligned {len(words)} words to {len(turns)} diarized turns", embeddings
+
+# Windowed mode for long recordings: only one window of audio is decoded at a time, and each window's
+# local speakers are linked to global ones by cosine similarity of their embeddings
+WINDOW_S = float(os.environ.get("DIARIZE_WINDOW_S", "300"))
+WINDOW_OVERLAP_S = float(os.environ.get("DIARIZE_WINDOW_OVERLAP_S", "10"))
+SPEAKER_LINK_THRESHOLD = float(os.environ.get("SPEAKER_LINK_THRESHOLD", "0.6"))
+
+class SpeakerLinker:
+    # Summed unit embeddings per global speaker; local labels map to the most similar unused one
+    def __init__(self, threshold=SPEAKER_LINK_THRESHOLD):
+        self.threshold = threshold
+        self.sums = []
+
+    def link(self, labels, embeddings):
+        # embeddings: one row per local label, as returned by pyannote with return_embeddings=True
+        mapping = {}
+        centroids = np.array(self.sums).reshape(len(self.sums), embeddings.shape[1])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids = np.divide(centroids, norms, out=np.zeros_like(centroids), where=norms > 0)
+        for label, embedding in zip(labels, embeddings):
+            norm = np.linalg.norm(embedding)
+            # Speakers with too little speech get NaN embeddings: they become new speakers nothing links to
+            usable = np.isfinite(norm) and norm > 0
+            if usable and len(centroids):
+                embedding = embedding / norm
+                similarities = centroids @ embedding
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    if int(index) not in mapping.values():
+                        mapping[label] = int(index)
+                        break
+            if label not in mapping:
+                mapping[label] = len(self.sums)
+                self.sums.append(np.zeros(embeddings.shape[1]))
+            if usable:
+                self.sums[mapping[label]] += embedding / np.linalg.norm(embedding)
+        return {label: f"SPEAKER_{index:02d}" for label, index in mapping.items()}
 
-    # Transcribe each segment
+def plan_windows(duration, window=WINDOW_S, overlap=WINDOW_OVERLAP_S):
+    # Yields (load_start, load_end, owned_start, owned_end); overlaps are split down the middle
+    step = window - overlap
+    start = 0.0
+    while True:
+        end = min(start + window, duration)
+        owned_start = start + overlap / 2 if start > 0 else 0.0
+        owned_end = end - overlap / 2 if end < duration else duration
+        yield start, end, owned_start, owned_end
+        if end >= duration:
+            break
+        start += step
+
+def transcribe_windowed(audio_file_path):
+    duration = librosa.get_duration(path=audio_file_path)
+    linker = SpeakerLinker()
     transcripts = []
-    word_counts = {}
-    for speaker, segments in speaker_segments.items():
-        speaker_transcript = []
-        word_count = 0
-        for start, end in segments:
-            segment_audio = audio[int(start * sr):int(end * sr)]
-            segment_transcript = transcribe_segment(segment_audio, sr)
-            word_count += len(segment_transcript.split())
-            speaker_transcript.append((start, end, speaker, segment_transcript))
-        transcripts.extend(speaker_transcript)
-        word_counts[speaker] = word_count
-
-    # Filter transcripts
-    filtered_transcripts = [(start, end, speaker, text) for (start, end, speaker, text) in transcripts if text.strip()]
-
-    # Sort transcripts by start time
-    sorted_transcripts = sorted(filtered_transcripts, key=lambda x: x[0])
+    windows = asr_calls = 0
+    for start, end, owned_start, owned_end in plan_windows(duration):
+        audio, sr = librosa.load(audio_file_path, sr=ASR_SAMPLE_RATE, offset=start, duration=end - start)
+        audio = audio.astype(np.float32)
+        diarization, embeddings = diarization_pipeline({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": sr}, return_embeddings=True)
+        labels = linker.link(diarization.labels(), embeddings)
+
+        # Keep only the part of each turn this window owns, in window-local time
+        turns = []
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            turn_start, turn_end = max(turn.start, owned_start - start), min(turn.end, owned_end - start)
+            if turn_end > turn_start:
+                turns.append((turn_start, turn_end, labels[speaker]))
+        turns, _ = plan_segments(turns)
+        texts = transcribe_segments([audio[int(turn_start * sr):int(turn_end * sr)] for turn_start, turn_end, _ in turns])
+        transcripts.extend((turn_start + start, turn_end + start, speaker, text) for (turn_start, turn_end, speaker), text in zip(turns, texts))
+        windows += 1
+        asr_calls += len(turns)
+        del audio
+    embeddings = {f"SPEAKER_{index:02d}": total for index, total in enumerate(linker.sums)}
+    return transcripts, f"Windowed: {windows} windows of {WINDOW_S:.0f}s, {len(linker.sums)} speakers linked, {asr_calls} ASR calls", embeddings
+
+def transcribe_and_diarize(audio_file_path, speaker_names, mode="segments", enroll=False):
+    if mode == "windowed":
+        # Decodes window by window, so the full recording is never held in memory
+        transcripts, footer, embeddings = transcribe_windowed(audio_file_path)
+    else:
+        # Load audio file, resampled once to 16 kHz mono float32
+        audio, sr = librosa.load(audio_file_path, sr=ASR_SAMPLE_RATE)
+        audio = audio.astype(np.float32)
+
+        if mode == "aligned":
+            transcripts, footer, embeddings = transcribe_aligned(audio, sr)
+        else:
+            transcripts, footer, embeddings = transcribe_per_segment(audio, sr)
 
     # Map speakers to provided names
     speaker_map = {f"SPEAKER_{i:02d}": speaker_names[i] if i < len(speaker_names) else f"Speaker {i + 1}" for i in
                    range(len(speaker_names))}
 
+    # Enrolled voices override the order-based guess; a name taken by a recognized voice is not reused
+    labels = sorted(embeddings)
+    identified = {}
+    if labels:
+        matches = speaker_store.identify(np.array([embeddings[label] for label in labels]))
+        identified = {label: name for label, name in zip(labels, matches) if name is not None}
+    speaker_map = {label: name for label, name in speaker_map.items() if name and name not in identified.values()}
+    speaker_map.update(identified)
+
+    if enroll:
+        enrolled = []
+        for label in labels:
+            if label in speaker_map and speaker_store.enroll(speaker_map[label], embeddings[label]):
+                enrolled.append(speaker_map[label])
+        speaker_store.save()
+        logging.info(f"Enrolled speakers: {enrolled}")
+
+    # Columnar, start-sorted copy of the non-empty turns under their display names, kept for range queries
+    transcript = DiarizedTranscript([(start, end, speaker_map.get(speaker, speaker), text) for start, end, speaker, text in transcripts if text.strip()])
+    transcript_id = transcript_store.add(transcript)
+
     # Format results for display
     result = ""
-    for start, end, speaker, text in sorted_transcripts:
-        speaker_name = speaker_map.get(speaker, speaker)
-        result += f"{start:.2f}-{end:.2f} {speaker_name}: {text}\n"
+    for turn in transcript.query():
+        result += f"{turn['start']:.2f}-{turn['end']:.2f} {turn['speaker']}: {turn['text']}\n"
 
     # Append word counts to result
     result += "\nWord Counts:\n"
-    for speaker, count in word_counts.items():
-        speaker_name = speaker_map.get(speaker, speaker)
-        result += f"{speaker_name}: {count} words\n"
+    for speaker, count in transcript.word_counts.items():
+        result += f"{speaker}: {count} words\n"
+
+    result += f"\n{footer}\n"
+    if identified:
+        result += f"Recognized enrolled speakers: {', '.join(identified.values())}\n"
+    result += f"Transcript id: {transcript_id}\n"
 
     return result
 
@@ -104,17 +349,17 @@ async def serve_diarization_page():
         return HTMLResponse(content=file.read())
 
 @app.post("/transcribe_diarize", response_class=HTMLResponse)
-async def transcribe_diarize(request: Request, audio_file: UploadFile = File(...), speaker_names: str = Form(...)):
+async def transcribe_diarize(request: Request, audio_file: UploadFile = File(...), speaker_names: str = Form(...), mode: str = Form("segments"), enroll: bool = Form(False)):
     try:
-        # Save the uploaded audio file to a temporary file
+        # Save the uploaded audio file to a temporary file in fixed-size chunks, never holding it all in memory
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
             audio_file_path = tmp_file.name
-            with open(audio_file_path, "wb") as f:
-                f.write(await audio_file.read())
+            while chunk := await audio_file.read(READ_SIZE):
+                tmp_file.write(chunk)
 
         # Process the audio file
         speaker_names_list = [name.strip() for name in speaker_names.split(",")]
-        result = transcribe_and_diarize(audio_file_path, speaker_names_list)
+        result = transcribe_and_diarize(audio_file_path, speaker_names_list, mode, enroll)
 
         # Delete the temporary audio file
         os.remove(audio_file_path)
@@ -126,6 +371,31 @@ async def transcribe_diarize(request: Request, audio_file: UploadFile = File(...
         error_message = f"Error: {str(e)}"
         return HTMLResponse(content=f"<h2>{error_message}</h2>", status_code=500)
 
+@app.get("/transcripts/{transcript_id}")
+async def query_transcript(transcript_id: str, start: float = None, end: float = None, speaker: str = None):
+    # Turns overlapping [start, end) seconds, optionally only one speaker's, found by binary search
+    transcript = transcript_store.get(transcript_id)
+    if transcript is None:
+        return JSONResponse({"error": "Unknown or expired transcript id"}, status_code=404)
+    return {
+        "duration": transcript.duration,
+        "speakers": transcript.speakers,
+        "word_counts": transcript.word_counts,
+        "turns": transcript.query(start, end, speaker),
+    }
+
+@app.get("/speakers")
+async def list_speakers():
+    # Enrolled names with the number of recordings each embedding was averaged over
+    return speaker_store.stats()
+
+@app.delete("/speakers/{name}")
+async def remove_speaker(name: str):
+    removed = speaker_store.remove(name)
+    if removed:
+        speaker_store.save()
+    return {"removed": removed}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
 
@@ -1,8 +1,10 @@
 import torch
 import logging
 import gradio as gr
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import pipeline
+from translation_engine import load_translator
 import os
+from translation_stage import translate_transcription, translation_memory
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,25 +13,18 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 whisper_model_name = "openai/whisper-medium"  # Use the appropriate model name from Hugging Face
 whisper_pipeline = pipeline("automatic-speech-recognition", model=whisper_model_name)
 
-# Setup translation pipeline using Hugging Face's transformers library
+# Setup translation with the configured engine (transformers pipeline or CTranslate2 int8)
 model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-translator = pipeline("translation", model=model, tokenizer=tokenizer)
+translator = load_translator(model_name)
 
 def transcribe_and_translate(audio_file):
     try:
         # Transcribe audio using Whisper model from Hugging Face
         transcription_result = whisper_pipeline(audio_file)
         
-        # Extract transcription text
-        transcription_text = transcription_result['text']
-        
-        # Translate from Hindi to English
-        translation_result = translator(transcription_text, max_length=400)
-        
-        # Extract and return translated text
-        translated_text = translation_result[0]['translation_text']
+        # Translate from Hindi to English sentence by sentence, in batches
+        translated_text = translate_transcription(translator, transcription_result)
+        logging.info(f"Translation memory: {translation_memory.stats()}")
         
         return translated_text
     except Exception as e:
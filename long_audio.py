@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+import numpy as np
+from vad import frame_energy_db, FRAME_MS
+
+SAMPLE_RATE = 16000
+# Recordings longer than this are split into shards and transcribed in parallel
+LONG_AUDIO_S = float(os.environ.get("LONG_AUDIO_S", "600"))
+MIN_SHARD_S = 60.0
+# Each shard extends this far past its cut on both sides so boundary words are heard in full
+SHARD_OVERLAP_S = 3.0
+# Cuts are moved to the quietest frame within this distance of the even split point
+CUT_SEARCH_S = 15.0
+
+def is_long_audio(audio, sample_rate=SAMPLE_RATE):
+    return len(audio) / sample_rate > LONG_AUDIO_S
+
+def quietest_point(energy, target_frame, search_frames):
+    low = max(0, target_frame - search_frames)
+    high = min(len(energy), target_frame + search_frames + 1)
+    return low + int(np.argmin(energy[low:high]))
+
+def plan_shards(audio, shard_count, sample_rate=SAMPLE_RATE, overlap_s=SHARD_OVERLAP_S, min_shard_s=MIN_SHARD_S):
+    # Returns (slice_start, slice_end, keep_start_s, keep_end_s) per shard; cuts sit at silences
+    duration = len(audio) / sample_rate
+    shard_count = max(1, min(shard_count, int(duration // min_shard_s)))
+    frame_length = int(sample_rate * FRAME_MS / 1000)
+    energy = frame_energy_db(audio, frame_length)
+    search_frames = int(CUT_SEARCH_S * 1000 / FRAME_MS)
+
+    cuts = [0.0]
+    for i in range(1, shard_count):
+        target_frame = int(len(energy) * i / shard_count)
+        cuts.append(quietest_point(energy, target_frame, search_frames) * frame_length / sample_rate)
+    cuts.append(duration)
+
+    overlap = int(overlap_s * sample_rate)
+    shards = []
+    for keep_start, keep_end in zip(cuts, cuts[1:]):
+        slice_start = max(0, int(keep_start * sample_rate) - overlap)
+        slice_end = min(len(audio), int(keep_end * sample_rate) + overlap)
+        shards.append((slice_start, slice_end, keep_start, keep_end))
+    return shards
+
+def inside(item, keep_start, keep_end):
+    midpoint = (item["start"] + item["end"]) / 2
+    return keep_start <= midpoint < keep_end
+
+def stitch(shard_results, shards, sample_rate=SAMPLE_RATE):
+    # Moves every shard onto the original timeline and keeps each word only from the shard that owns its midpoint
+    segments = []
+    for result, (slice_start, _, keep_start, keep_end) in zip(shard_results, shards):
+        offset = slice_start / sample_rate
+        for segment in result.get("segments", []):
+            segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            words = segment.get("words")
+            if words:
+                words = [dict(word, start=word["start"] + offset, end=word["end"] + offset) for word in words]
+                words = [word for word in words if inside(word, keep_start, keep_end)]
+                if not words:
+                    continue
+                segment.update(words=words, start=words[0]["start"], end=words[-1]["end"], text="".join(word["word"] for word in words))
+            elif not inside(segment, keep_start, keep_end):
+                continue
+            segments.append(segment)
+
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    stitched = {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+    if any(result.get("vad") for result in shard_results):
+        # Speech is counted only inside each shard's keep range, so silence in the overlaps is not counted twice
+        speech_seconds = 0.0
+        for result, (slice_start, _, keep_start, keep_end) in zip(shard_results, shards):
+            offset = slice_start / sample_rate
+            for start, end in result.get("speech_regions", []):
+                speech_seconds += max(0.0, min(end + offset, keep_end) - max(start + offset, keep_start))
+        audio_seconds = shards[-1][3]
+        stitched["vad"] = {"audio_seconds": round(audio_seconds, 2), "speech_seconds": round(speech_seconds, 2), "skipped_seconds": round(audio_seconds - speech_seconds, 2)}
+    return stitched
+
+async def transcribe_sharded(worker_pool, transcribe_shard, audio, *args, sample_rate=SAMPLE_RATE):
+    # transcribe_shard runs in the pool's workers and must return openai-whisper style results with word timestamps
+    shards = plan_shards(audio, worker_pool.max_workers, sample_rate)
+    logging.info(f"Transcribing {len(audio) / sample_rate:.0f}s of audio as {len(shards)} parallel shard(s).")
+    shard_results = await asyncio.gather(*(worker_pool.run(transcribe_shard, audio[start:end], *args) for start, end, _, _ in shards))
+    return stitch(shard_results, shards, sample_rate)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Memory tier holds the hottest results, the SQLite tier survives restarts
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", "result_cache.db")
+MEMORY_CACHE_MB = float(os.environ.get("RESULT_MEMORY_CACHE_MB", "32"))
+DISK_CACHE_MB = float(os.environ.get("RESULT_DISK_CACHE_MB", "512"))
+HASH_READ_SIZE = 1024 * 1024
+
+async def upload_digest(upload_file):
+    # Hashes the spooled upload and rewinds it so it can still be decoded
+    digest = hashlib.sha256()
+    while True:
+        chunk = await upload_file.read(HASH_READ_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await upload_file.seek(0)
+    return digest.hexdigest()
+
+def cache_key(audio_digest, *parts):
+    return hashlib.sha256("|".join([audio_digest, *(str(part) for part in parts)]).encode()).hexdigest()
+
+class ResultCache:
+    # Two-tier LRU of JSON-serialisable results, both tiers bounded by size in bytes
+    def __init__(self, path=RESULT_CACHE_PATH, memory_mb=MEMORY_CACHE_MB, disk_mb=DISK_CACHE_MB):
+        self.memory_limit = int(memory_mb * 1024 * 1024)
+        self.disk_limit = int(disk_mb * 1024 * 1024)
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self.db.commit()
+
+    def remember(self, key, payload):
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = payload
+        self.memory_bytes += len(payload)
+        while self.memory_bytes > self.memory_limit and self.memory:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def get(self, key):
+        with self.lock:
+            payload = self.memory.get(key)
+            if payload is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload)
+
+            row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.remember(key, row[0])
+            self.hits += 1
+            self.disk_hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        payload = json.dumps(value)
+        with self.lock:
+            self.remember(key, payload)
+            self.db.execute("INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)", (key, payload, len(payload), time.time()))
+            self.evict_disk()
+            self.db.commit()
+
+    def evict_disk(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.disk_limit:
+            return
+        evicted = 0
+        for key, size in self.db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            if total <= self.disk_limit:
+                break
+            self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logging.info(f"Result cache evicted {evicted} entries from disk.")
+
+    def stats(self):
+        with self.lock:
+            disk_entries, disk_bytes = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
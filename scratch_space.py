@@ -0,0 +1,22 @@
+import contextlib
+import os
+import shutil
+import tempfile
+
+# Per-job scratch directories live on tmpfs when the host has one (uploads then cost RAM, not disk I/O);
+# set SCRATCH_ROOT to put them somewhere else
+SCRATCH_ROOT = os.environ.get("SCRATCH_ROOT") or ("/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None)
+
+@contextlib.contextmanager
+def scratch_workspace(prefix="job-"):
+    # A private directory per job, removed with everything in it however the job ends
+    path = tempfile.mkdtemp(prefix=prefix, dir=SCRATCH_ROOT)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def safe_suffix(filename, default=""):
+    # Keep only the extension of a client-supplied name so it can never escape the workspace
+    suffix = os.path.splitext(os.path.basename(filename or ""))[1]
+    return suffix if suffix[1:].isalnum() else default
@@ -0,0 +1,90 @@
+import logging
+import os
+import threading
+import numpy as np
+
+# Enrolled speakers persisted locally so repeat participants are labelled by voice, not by order
+SPEAKER_STORE_PATH = os.environ.get("SPEAKER_STORE_PATH", "speaker_store.npz")
+# Minimum cosine similarity for a diarized speaker to be labelled as an enrolled one
+SPEAKER_MATCH_THRESHOLD = float(os.environ.get("SPEAKER_MATCH_THRESHOLD", "0.7"))
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+class SpeakerStore:
+    # One row per enrolled name: the sum of that speaker's unit embeddings, plus a normalized copy for lookup
+    def __init__(self, path=SPEAKER_STORE_PATH, threshold=SPEAKER_MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.names = []
+        self.sums = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.names = [str(name) for name in data["names"]]
+                self.sums = data["sums"].astype(np.float32)
+                self.counts = data["counts"]
+            logging.info(f"Loaded {len(self.names)} enrolled speakers from {path}.")
+        self.matrix = normalize_rows(self.sums)
+
+    def identify(self, embeddings):
+        # embeddings: (n, dim). Returns an enrolled name or None per row; each name is used at most once
+        results = [None] * len(embeddings)
+        embeddings = np.nan_to_num(np.asarray(embeddings, dtype=np.float32))
+        with self.lock:
+            if not self.names or embeddings.shape[1] != self.matrix.shape[1]:
+                return results
+            similarities = normalize_rows(embeddings) @ self.matrix.T
+            names = list(self.names)
+        # Best pairs first, so two diarized speakers never get the same enrolled name
+        for flat in np.argsort(-similarities, axis=None):
+            row, column = divmod(int(flat), similarities.shape[1])
+            if similarities[row, column] < self.threshold:
+                break
+            if results[row] is None and names[column] not in results:
+                results[row] = names[column]
+        return results
+
+    def enroll(self, name, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if not np.isfinite(norm) or norm == 0:
+            return False
+        with self.lock:
+            if self.sums.shape[1] not in (0, len(embedding)):
+                raise ValueError(f"Embedding has {len(embedding)} dimensions, the store uses {self.sums.shape[1]}")
+            if name in self.names:
+                index = self.names.index(name)
+            else:
+                self.names.append(name)
+                self.sums = np.vstack([self.sums.reshape(-1, len(embedding)), np.zeros((1, len(embedding)), dtype=np.float32)])
+                self.counts = np.append(self.counts, 0)
+                index = len(self.names) - 1
+            self.sums[index] += embedding / norm
+            self.counts[index] += 1
+            self.matrix = normalize_rows(self.sums)
+        return True
+
+    def remove(self, name):
+        with self.lock:
+            if name not in self.names:
+                return False
+            index = self.names.index(name)
+            del self.names[index]
+            self.sums = np.delete(self.sums, index, axis=0)
+            self.counts = np.delete(self.counts, index)
+            self.matrix = normalize_rows(self.sums)
+        return True
+
+    def save(self):
+        # Written to a temporary file first so a crash never leaves a half-written store
+        with self.lock:
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(tmp_path, names=np.array(self.names, dtype=str), sums=self.sums, counts=self.counts)
+            os.replace(tmp_path, self.path)
+
+    def stats(self):
+        with self.lock:
+            return {name: int(count) for name, count in zip(self.names, self.counts)}
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+class StaticAsset:
+    def __init__(self, body, content_type, cache_control):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha1(body).hexdigest()[:16]
+        # Precompressed once at load time; each entry is (body, ETag)
+        self.variants = {"identity": (body, f'"{self.etag}"')}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{self.etag}-gz"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f'"{self.etag}-br"')
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.lower())
+    return accepted
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+class StaticAssets:
+    # In-memory asset store: loaded once, served with ETag/Cache-Control and 304s for conditional GETs
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self.assets = {}
+
+    def add(self, name, content, content_type=None, cache_control=None):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        self.assets[name] = StaticAsset(content, content_type, cache_control or f"public, max-age={self.max_age}")
+
+    def add_page(self, name, html):
+        # Pages are revalidated on every load, which costs a 304 rather than the whole document
+        self.add(name, html, "text/html", "no-cache")
+
+    def add_directory(self, directory):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as file:
+                    self.add(name, file.read())
+
+    def response(self, request, name):
+        asset = self.assets.get(name)
+        if asset is None:
+            return Response(status_code=404)
+
+        accepted = accepted_encodings(request)
+        encoding = next((encoding for encoding in ("br", "gzip") if encoding in accepted and encoding in asset.variants), "identity")
+        body, etag = asset.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.content_type, headers=headers)
@@ -0,0 +1,69 @@
+import logging
+import os
+import queue
+import threading
+from translation_stage import split_sentences, translate_texts, TRANSLATION_BATCH_SIZE
+
+# Whisper segments waiting for the translator; a full queue pauses ASR instead of growing memory
+SEGMENT_QUEUE_SIZE = int(os.environ.get("SEGMENT_QUEUE_SIZE", "32"))
+
+END_OF_STREAM = object()
+
+class StageError:
+    def __init__(self, error):
+        self.error = error
+
+def put_unless_stopped(segment_queue, item, stop):
+    while not stop.is_set():
+        try:
+            segment_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def produce_segments(model, audio, segment_queue, stop, language=None):
+    try:
+        for segment in model.iter_segments(audio, language=language):
+            if not put_unless_stopped(segment_queue, segment, stop):
+                return
+        put_unless_stopped(segment_queue, END_OF_STREAM, stop)
+    except Exception as e:
+        logging.error(f"ASR stage failed: {e}")
+        put_unless_stopped(segment_queue, StageError(e), stop)
+
+def next_batch(segment_queue, batch_size):
+    # Blocks for one segment, then takes whatever else ASR has already produced
+    batch = [segment_queue.get()]
+    while len(batch) < batch_size and batch[-1] is not END_OF_STREAM and not isinstance(batch[-1], StageError):
+        try:
+            batch.append(segment_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def pipelined_transcribe_translate(model, translator, audio, language=None, batch_size=TRANSLATION_BATCH_SIZE):
+    # Runs ASR in a producer thread and translates its segments as they arrive;
+    # yields {"start", "end", "text", "translation"} per segment, in order
+    segment_queue = queue.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce_segments, args=(model, audio, segment_queue, stop, language), daemon=True)
+    producer.start()
+    try:
+        finished = False
+        while not finished:
+            batch = next_batch(segment_queue, batch_size)
+            if isinstance(batch[-1], StageError):
+                raise batch[-1].error
+            if batch[-1] is END_OF_STREAM:
+                batch.pop()
+                finished = True
+
+            pieces = [split_sentences(segment["text"]) for segment in batch]
+            translations = iter(translate_texts(translator, [piece for segment_pieces in pieces for piece in segment_pieces], batch_size))
+            for segment, segment_pieces in zip(batch, pieces):
+                translated = " ".join(text for text in (next(translations) for _ in segment_pieces) if text)
+                yield {"start": segment["start"], "end": segment["end"], "text": segment["text"].strip(), "translation": translated}
+    finally:
+        # Lets the producer exit at its next segment if the consumer stopped early
+        stop.set()
@@ -0,0 +1,85 @@
+import logging
+import os
+import threading
+import time
+from transformers import pipeline
+
+SUMMARIZER_MODEL = os.environ.get("SUMMARIZER_MODEL", "facebook/bart-large-cnn")
+# "startup" loads while the app starts, "lazy" on the first summary request
+SUMMARIZER_LOAD = os.environ.get("SUMMARIZER_LOAD", "startup")
+WARMUP_TEXT = "The meeting covered the quarterly results, the hiring plan and the product roadmap. " * 8
+
+def model_size_bytes(model):
+    params = sum(p.numel() * p.element_size() for p in model.parameters())
+    buffers = sum(b.numel() * b.element_size() for b in model.buffers())
+    return params + buffers
+
+def process_rss_bytes():
+    # Resident set size from /proc; None where that is not available
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+class SummarizerHolder:
+    # Owns one summarization pipeline for the life of the process; loaded once and warmed before use
+    def __init__(self, model_name=SUMMARIZER_MODEL):
+        self.model_name = model_name
+        self.lock = threading.Lock()
+        self.pipe = None
+        self.device = None
+        self.load_s = None
+        self.warmup_s = None
+        self.size_bytes = None
+        self.loaded_at = None
+        self.calls = 0
+
+    def get(self):
+        if self.pipe is None:
+            with self.lock:
+                if self.pipe is None:
+                    self.load()
+        return self.pipe
+
+    def load(self):
+        import torch
+        start_time = time.time()
+        self.device = 0 if torch.cuda.is_available() else -1
+        pipe = pipeline("summarization", model=self.model_name, device=self.device)
+        self.load_s = time.time() - start_time
+
+        # One short generation so the first real request does not pay for lazy initialization
+        start_time = time.time()
+        pipe(WARMUP_TEXT, max_length=30, min_length=10, do_sample=False)
+        self.warmup_s = time.time() - start_time
+
+        self.size_bytes = model_size_bytes(pipe.model)
+        self.loaded_at = time.time()
+        self.pipe = pipe
+        logging.info(f"Loaded {self.model_name} in {self.load_s:.1f}s, warmed up in {self.warmup_s:.1f}s ({self.size_bytes / 1e6:.0f} MB).")
+
+    def __call__(self, text, **kwargs):
+        pipe = self.get()
+        with self.lock:
+            self.calls += 1
+        return pipe(text, **kwargs)
+
+    def status(self):
+        status = {
+            "model": self.model_name,
+            "loaded": self.pipe is not None,
+            "load_mode": SUMMARIZER_LOAD,
+            "device": "cpu" if self.device == -1 else f"cuda:{self.device}" if self.device is not None else None,
+            "load_s": round(self.load_s, 2) if self.load_s is not None else None,
+            "warmup_s": round(self.warmup_s, 2) if self.warmup_s is not None else None,
+            "model_mb": round(self.size_bytes / 1e6) if self.size_bytes is not None else None,
+            "uptime_s": round(time.time() - self.loaded_at) if self.loaded_at is not None else None,
+            "calls": self.calls,
+        }
+        rss = process_rss_bytes()
+        status["process_rss_mb"] = round(rss / 1e6) if rss is not None else None
+        return status
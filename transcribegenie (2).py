@@ -1,46 +1,210 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 import uvicorn
+import os
 import time
 import logging
+import threading
+import uuid
+import json
+import asyncio
+import queue
+from concurrent.futures import Future
+from collections import OrderedDict, deque
 import numpy as np
 import torch
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 from pydub import AudioSegment
 from io import BytesIO
 from profanityfilter import ProfanityFilter
+from worker_pool import WorkerPool, QueueFullError, busy_response
+from static_assets import StaticAssets
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Upper bound on the weights kept resident by the model cache
+MODEL_CACHE_BUDGET_MB = int(os.environ.get("MODEL_CACHE_BUDGET_MB", "6144"))
+
+class LoadedModel:
+    def __init__(self, model, processor, pipe, device, size_bytes):
+        self.model = model
+        self.processor = processor
+        self.pipe = pipe
+        self.device = device
+        self.size_bytes = size_bytes
+
+class ModelCache:
+    # Process-wide LRU of loaded models keyed by model_choice, evicted to stay within the memory budget
+    def __init__(self, budget_mb):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    def used_bytes(self):
+        return sum(entry.size_bytes for entry in self.entries.values())
+
+    def get(self, model_choice, loader):
+        with self.lock:
+            entry = self.entries.get(model_choice)
+            if entry is not None:
+                self.entries.move_to_end(model_choice)
+                logging.info(f"Model cache hit for {model_choice}.")
+                return entry
+            load_lock = self.load_locks.setdefault(model_choice, threading.Lock())
+
+        # Only one thread loads a given model; the others wait and then hit the cache
+        with load_lock:
+            with self.lock:
+                entry = self.entries.get(model_choice)
+                if entry is not None:
+                    self.entries.move_to_end(model_choice)
+                    return entry
+
+            logging.info(f"Model cache miss for {model_choice}, loading.")
+            entry = loader(model_choice)
+
+            with self.lock:
+                self.evict_for(entry.size_bytes)
+                self.entries[model_choice] = entry
+                logging.info(f"Model cache holds {len(self.entries)} model(s), {self.used_bytes() / 1e6:.0f} MB of {self.budget_bytes / 1e6:.0f} MB.")
+            return entry
+
+    def evict_for(self, incoming_bytes):
+        while self.entries and self.used_bytes() + incoming_bytes > self.budget_bytes:
+            evicted_choice, evicted = self.entries.popitem(last=False)
+            logging.info(f"Evicting model {evicted_choice} ({evicted.size_bytes / 1e6:.0f} MB) from cache.")
+            del evicted
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+def model_size_bytes(model):
+    params = sum(p.numel() * p.element_size() for p in model.parameters())
+    buffers = sum(b.numel() * b.element_size() for b in model.buffers())
+    return params + buffers
+
+model_cache = ModelCache(MODEL_CACHE_BUDGET_MB)
+
+SAMPLE_RATE = 16000
+CHUNK_LENGTH_S = 30
+# Neighbouring chunks share this much audio (the pipeline's own default stride) so no word is cut in half;
+# the repeated words are dropped again when chunk texts are joined
+CHUNK_OVERLAP_S = 5
+# Longest run of words compared when joining two chunk texts
+MAX_OVERLAP_WORDS = 48
+# Finished jobs are dropped this long after submission
+JOB_TTL_S = 600
+# Micro-batching: chunks from concurrent requests are grouped up to this size / wait
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "16"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", "25"))
+# Chunks one request may have queued at once: batches then fill from concurrent requests, a long upload
+# cannot crowd out short ones, and each request still sees its chunks finish one after another
+CHUNKS_IN_FLIGHT = int(os.environ.get("CHUNKS_IN_FLIGHT", "2"))
+
+def chunk_starts(sample_count, chunk_samples, overlap_samples):
+    step = chunk_samples - overlap_samples
+    starts = [0]
+    while starts[-1] + chunk_samples < sample_count:
+        starts.append(starts[-1] + step)
+    return starts
+
+def normalize_word(word):
+    return "".join(character for character in word.lower() if character.isalnum())
+
+def overlap_length(previous_words, next_words, max_words=MAX_OVERLAP_WORDS):
+    # Number of leading words of next_words already heard at the end of previous_words. Every alignment of
+    # the tail against the head is scored by its match ratio, as in the pipeline's longest-common-sequence merge
+    previous = [normalize_word(word) for word in previous_words[-max_words:]]
+    following = [normalize_word(word) for word in next_words[:max_words]]
+    best_length, best_score = 0, 0.5
+    for length in range(1, min(len(previous), len(following)) + 1):
+        matches = sum(1 for a, b in zip(previous[-length:], following[:length]) if a and a == b)
+        # Ties go to the longer overlap
+        score = matches / length + length / 10000
+        if matches > 1 and score > best_score:
+            best_length, best_score = length, score
+    return best_length
+
+class BatchScheduler:
+    # Gathers chunks that share a model and language into one pipeline call and fans the results back out
+    def __init__(self, get_pipeline, model_choice, language, max_batch_size, max_wait_ms):
+        self.get_pipeline = get_pipeline
+        self.model_choice = model_choice
+        self.language = language
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.pending = queue.Queue()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, chunk):
+        future = Future()
+        self.pending.put((chunk, future))
+        return future
+
+    def next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        generate_kwargs = {"language": self.language} if self.language else {}
+        while True:
+            batch = self.next_batch()
+            chunks = [chunk for chunk, _ in batch]
+            try:
+                pipe = self.get_pipeline(self.model_choice)
+                results = pipe(chunks, batch_size=len(chunks), generate_kwargs=generate_kwargs)
+            except Exception as e:
+                logging.error(f"Error running batch of {len(chunks)} chunk(s) for {self.model_choice}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logging.info(f"Ran batch of {len(chunks)} chunk(s) for {self.model_choice}.")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+schedulers = {}
+schedulers_lock = threading.Lock()
+
+def get_scheduler(get_pipeline, model_choice, language):
+    key = (model_choice, language or None)
+    with schedulers_lock:
+        if key not in schedulers:
+            schedulers[key] = BatchScheduler(get_pipeline, model_choice, language, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+        return schedulers[key]
+
 class SpeechTranscriber:
     def __init__(self):
-        self.model = None
-        self.processor = None
-        self.device = None
-        self.pipe = None
         self.profanity_filter = ProfanityFilter()
 
     def load_model(self, model_id):
         try:
-            self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
-            self.model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
-            self.model.to(self.device)
-            self.processor = AutoProcessor.from_pretrained(model_id)
-            logging.info(f"Model {model_id} loaded successfully on {self.device}.")
+            device = "cuda:0" if torch.cuda.is_available() else "cpu"
+            model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
+            model.to(device)
+            processor = AutoProcessor.from_pretrained(model_id)
+            logging.info(f"Model {model_id} loaded successfully on {device}.")
+            return model, processor, device
         except Exception as e:
             logging.error(f"Error loading model {model_id}: {e}")
             raise
 
-    def create_asr_pipeline(self):
+    def create_asr_pipeline(self, model, processor):
         try:
-            self.pipe = pipeline(
+            pipe = pipeline(
                 "automatic-speech-recognition",
-                model=self.model,
-                tokenizer=self.processor.tokenizer,
-                feature_extractor=self.processor.feature_extractor,
+                model=model,
+                tokenizer=processor.tokenizer,
+                feature_extractor=processor.feature_extractor,
                 max_new_tokens=128,
                 chunk_length_s=30,
                 batch_size=16,
@@ -48,56 +212,140 @@ class SpeechTranscriber:
                 device=0 if torch.cuda.is_available() else -1,
             )
             logging.info("ASR pipeline created successfully.")
+            return pipe
         except Exception as e:
             logging.error(f"Error creating ASR pipeline: {e}")
             raise
 
-    def transcribe_audio(self, audio_data, model_choice, language=None, use_profanity_filter=False):
-        model_id = f"openai/whisper-{model_choice}"
-        try:
-            self.load_model(model_id)
-            self.create_asr_pipeline()
+    def build_model(self, model_choice):
+        model, processor, device = self.load_model(f"openai/whisper-{model_choice}")
+        pipe = self.create_asr_pipeline(model, processor)
+        return LoadedModel(model, processor, pipe, device, model_size_bytes(model))
 
-            audio = AudioSegment.from_file(BytesIO(audio_data))
-            audio = audio.set_channels(1).set_frame_rate(16000)
-            audio_array = np.array(audio.get_array_of_samples())
+    def get_pipeline(self, model_choice):
+        return model_cache.get(model_choice, self.build_model).pipe
 
-            audio_array = audio_array.astype(np.float32) / np.max(np.abs(audio_array))
+    def decode_audio(self, audio_data):
+        audio = AudioSegment.from_file(BytesIO(audio_data))
+        audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE)
+        audio_array = np.array(audio.get_array_of_samples())
 
-            try:
-                start_time = time.time()
-                progress = 0
-                while progress < 100:
-                    time.sleep(1)
-                    progress += 10
-                result = self.pipe(audio_array, generate_kwargs={"language": language} if language else {})
-                end_time = time.time()
-                runtime = end_time - start_time
-            except Exception as e:
-                logging.error(f"Error during transcription: {e}")
-                return f"Error during transcription: {e}", None, None, None
+        peak = np.max(np.abs(audio_array)) if audio_array.size else 0
+        return audio_array.astype(np.float32) / (peak or 1)
 
-            transcription_text = result.get("text", "")
-            profanity_detected = False
+    def filter_profanity(self, text):
+        if not self.profanity_filter.is_profane(text):
+            return text, False
+        return ' '.join(['*' * len(word) if self.profanity_filter.is_profane(word) else word for word in text.split()]), True
 
-            if use_profanity_filter:
-                profanity_detected = self.profanity_filter.is_profane(transcription_text)
-                if profanity_detected:
-                    transcription_text = ' '.join(['*' * len(word) if self.profanity_filter.is_profane(word) else word for word in transcription_text.split()])
+    def iter_transcription(self, audio_data, model_choice, language=None, use_profanity_filter=False):
+        # Yields one progress event per finished 30s chunk (overlapping by CHUNK_OVERLAP_S), then a final "done" event
+        start_time = time.time()
+        scheduler = get_scheduler(self.get_pipeline, model_choice, language)
+        audio_array = self.decode_audio(audio_data)
 
-            word_count = len(transcription_text.split())
+        chunk_samples = CHUNK_LENGTH_S * SAMPLE_RATE
+        starts = chunk_starts(len(audio_array), chunk_samples, CHUNK_OVERLAP_S * SAMPLE_RATE)
+        futures = deque(scheduler.submit(audio_array[start:start + chunk_samples]) for start in starts[:CHUNKS_IN_FLIGHT])
 
-            logging.info(f"Transcription: {transcription_text}")
-            logging.info(f"Profanity detected: {profanity_detected}")
-            logging.info(f"Runtime: {runtime} seconds")
-            logging.info(f"Word Count: {word_count}")
+        words = []
+        texts = []
+        profanity_detected = False
+        for index in range(len(starts)):
+            result = futures.popleft().result()
+            # Refill the window as soon as a chunk is done
+            next_index = index + CHUNKS_IN_FLIGHT
+            if next_index < len(starts):
+                futures.append(scheduler.submit(audio_array[starts[next_index]:starts[next_index] + chunk_samples]))
+            chunk_words = result.get("text", "").split()
+            # The start of this chunk was already transcribed at the end of the previous one
+            chunk_words = chunk_words[overlap_length(words, chunk_words):]
+            words.extend(chunk_words)
+            chunk_text = " ".join(chunk_words)
+            if use_profanity_filter and chunk_text:
+                chunk_text, chunk_profane = self.filter_profanity(chunk_text)
+                profanity_detected = profanity_detected or chunk_profane
+            texts.append(chunk_text)
+            yield {
+                "event": "progress",
+                "chunk": index + 1,
+                "chunks": len(starts),
+                "progress": round(100 * (index + 1) / len(starts), 1),
+                "text": chunk_text,
+            }
+
+        transcription_text = " ".join(text for text in texts if text)
+        runtime = time.time() - start_time
+        word_count = len(transcription_text.split())
 
-            return transcription_text, runtime, word_count, profanity_detected
+        logging.info(f"Transcription: {transcription_text}")
+        logging.info(f"Profanity detected: {profanity_detected}")
+        logging.info(f"Runtime: {runtime} seconds")
+        logging.info(f"Word Count: {word_count}")
+
+        yield {
+            "event": "done",
+            "transcription": transcription_text,
+            "runtime": runtime,
+            "word_count": word_count,
+            "profanity_detected": profanity_detected,
+        }
 
+    def transcribe_audio(self, audio_data, model_choice, language=None, use_profanity_filter=False):
+        try:
+            for event in self.iter_transcription(audio_data, model_choice, language, use_profanity_filter):
+                pass
+            return event["transcription"], event["runtime"], event["word_count"], event["profanity_detected"]
         except Exception as e:
             logging.error(f"Error in transcribe_audio: {e}")
             return f"Error in transcribe_audio: {e}", None, None, None
 
+class TranscriptionJob:
+    # Event log of one submitted transcription; readers block until new events arrive
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.created = time.time()
+        self.events = []
+        self.finished = False
+        self.condition = threading.Condition()
+
+    def publish(self, event, final=False):
+        with self.condition:
+            self.events.append(event)
+            self.finished = self.finished or final
+            self.condition.notify_all()
+
+    def wait_for_events(self, start, timeout=15):
+        with self.condition:
+            if len(self.events) <= start and not self.finished:
+                self.condition.wait(timeout)
+            return self.events[start:], self.finished
+
+jobs = {}
+jobs_lock = threading.Lock()
+
+def run_job(job, audio_data, model_choice, language, use_profanity_filter):
+    try:
+        for event in transcriber.iter_transcription(audio_data, model_choice, language, use_profanity_filter):
+            job.publish(event, final=event["event"] == "done")
+    except Exception as e:
+        logging.error(f"Error in transcription job {job.id}: {e}")
+        job.publish({"event": "error", "detail": str(e)}, final=True)
+
+# Request threads wait on the batch schedulers, so a thread pool keeps the model cache and batching shared;
+# the pool only bounds how many transcriptions are admitted at once
+worker_pool = WorkerPool(max_workers=int(os.environ.get("TRANSCRIBE_WORKERS", "8")), use_processes=False)
+
+def submit_job(audio_data, model_choice, language, use_profanity_filter):
+    job = TranscriptionJob()
+    worker_pool.submit(run_job, job, audio_data, model_choice, language, use_profanity_filter)
+    with jobs_lock:
+        expired = [job_id for job_id, old in jobs.items() if old.finished and time.time() - old.created > JOB_TTL_S]
+        for job_id in expired:
+            del jobs[job_id]
+        jobs[job.id] = job
+    return job
+
 app = FastAPI()
 
 app.add_middleware(
@@ -108,8 +356,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.get("/", response_class=HTMLResponse)
-async def get_root():
+def index_page():
     return """
 <!DOCTYPE html>
 <html lang="en">
@@ -320,18 +567,55 @@ async def get_root():
             progressBarFill.style.width = '0%';
             progressBarFill.textContent = '0%';
 
+            const transcriptionResult = document.getElementById('transcriptionResult');
+            transcriptionResult.textContent = '';
+
             try {
-                const response = await fetch('/transcribe', {
+                const submitResponse = await fetch('/jobs', {
                     method: 'POST',
                     body: formData
                 });
 
-                if (!response.ok) {
+                if (!submitResponse.ok) {
                     throw new Error('Network response was not ok');
                 }
 
-                const data = await response.json();
-                document.getElementById('transcriptionResult').textContent = data.transcription;
+                const job = await submitResponse.json();
+                const response = await fetch(job.events);
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = '';
+                let data = null;
+
+                while (data === null) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        throw new Error('Transcription stream ended early');
+                    }
+                    buffered += decoder.decode(value, { stream: true });
+                    const lines = buffered.split('\\n');
+                    buffered = lines.pop();
+
+                    for (const line of lines) {
+                        if (!line.trim()) {
+                            continue;
+                        }
+                        const event = JSON.parse(line);
+                        if (event.event === 'progress') {
+                            progressBarFill.style.width = event.progress + '%';
+                            progressBarFill.textContent = Math.round(event.progress) + '%';
+                            if (event.text) {
+                                transcriptionResult.textContent += (transcriptionResult.textContent ? ' ' : '') + event.text;
+                            }
+                        } else if (event.event === 'done') {
+                            data = event;
+                        } else if (event.event === 'error') {
+                            throw new Error(event.detail);
+                        }
+                    }
+                }
+
+                transcriptionResult.textContent = data.transcription;
                 document.getElementById('runtimeResult').value = data.runtime;
                 document.getElementById('wordCountResult').value = data.word_count;
                 document.getElementById('profanityDetectedResult').value = data.profanity_detected;
@@ -370,6 +654,16 @@ async def get_root():
 </html>
     """
 
+# The page is compressed once and revalidated with its ETag instead of being re-sent
+static_assets = StaticAssets()
+static_assets.add_page("index.html", index_page())
+
+@app.get("/", response_class=HTMLResponse)
+async def get_root(request: Request):
+    return static_assets.response(request, "index.html")
+
+transcriber = SpeechTranscriber()
+
 class TranscriptionRequest(BaseModel):
     model_choice: str
     language: Optional[str] = None
@@ -382,10 +676,12 @@ async def transcribe_audio(
     language: Optional[str] = Form(None),
     profanity_filter: bool = Form(False)
 ):
-    transcriber = SpeechTranscriber()
     audio_data = await audio_file.read()
 
-    transcription, runtime, word_count, profanity_detected = transcriber.transcribe_audio(audio_data, model_choice, language, profanity_filter)
+    try:
+        transcription, runtime, word_count, profanity_detected = await worker_pool.run(transcriber.transcribe_audio, audio_data, model_choice, language, profanity_filter)
+    except QueueFullError as e:
+        return busy_response(e)
     return JSONResponse({
         "transcription": transcription,
         "runtime": runtime,
@@ -393,5 +689,41 @@ async def transcribe_audio(
         "profanity_detected": profanity_detected
     })
 
+@app.post("/jobs")
+async def create_job(
+    audio_file: UploadFile = File(...),
+    model_choice: str = Form(...),
+    language: Optional[str] = Form(None),
+    profanity_filter: bool = Form(False)
+):
+    audio_data = await audio_file.read()
+    try:
+        job = submit_job(audio_data, model_choice, language, profanity_filter)
+    except QueueFullError as e:
+        return busy_response(e)
+    return JSONResponse({"job_id": job.id, "events": f"/jobs/{job.id}/events"})
+
+@app.get("/queue")
+async def queue_stats():
+    return worker_pool.stats()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+
+    # NDJSON stream: one line per progress event, ending with "done" or "error"
+    async def stream():
+        sent = 0
+        finished = False
+        while not finished:
+            events, finished = await asyncio.to_thread(job.wait_for_events, sent)
+            for event in events:
+                yield json.dumps(event) + "\n"
+            sent += len(events)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+
+# Diarized transcripts kept for range queries; the least recently used one is evicted past this count
+TRANSCRIPT_STORE_SIZE = int(os.environ.get("TRANSCRIPT_STORE_SIZE", "64"))
+
+class DiarizedTranscript:
+    # Columnar turns sorted by start: float arrays for times, int speaker ids and one text blob with offsets
+    def __init__(self, turns):
+        turns = sorted(turns, key=lambda turn: turn[0])
+        self.speakers = sorted({speaker for _, _, speaker, _ in turns})
+        self.speaker_index = {speaker: index for index, speaker in enumerate(self.speakers)}
+
+        self.starts = np.array([turn[0] for turn in turns], dtype=np.float64)
+        self.ends = np.array([turn[1] for turn in turns], dtype=np.float64)
+        self.speaker_ids = np.array([self.speaker_index[turn[2]] for turn in turns], dtype=np.int32)
+        self.text = "".join(turn[3] for turn in turns)
+        self.offsets = np.zeros(len(turns) + 1, dtype=np.int64)
+        np.cumsum([len(turn[3]) for turn in turns], out=self.offsets[1:])
+
+        # Running max of end times keeps the overlap search logarithmic even when turns overlap
+        self.max_ends = np.maximum.accumulate(self.ends)
+        # Row numbers per speaker (already in start order) with that speaker's starts and running max end
+        self.rows_by_speaker = []
+        for index in range(len(self.speakers)):
+            rows = np.flatnonzero(self.speaker_ids == index)
+            self.rows_by_speaker.append((rows, self.starts[rows], np.maximum.accumulate(self.ends[rows])))
+        self.word_counts = {speaker: 0 for speaker in self.speakers}
+        for _, _, speaker, text in turns:
+            self.word_counts[speaker] += len(text.split())
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def duration(self):
+        return float(self.max_ends[-1]) if len(self) else 0.0
+
+    def turn(self, row):
+        return {
+            "start": round(float(self.starts[row]), 2),
+            "end": round(float(self.ends[row]), 2),
+            "speaker": self.speakers[self.speaker_ids[row]],
+            "text": self.text[self.offsets[row]:self.offsets[row + 1]],
+        }
+
+    def rows(self, start=None, end=None, speaker=None):
+        # Turns overlapping [start, end), optionally for one speaker
+        if speaker is None:
+            rows, starts, max_ends = None, self.starts, self.max_ends
+        elif speaker in self.speaker_index:
+            rows, starts, max_ends = self.rows_by_speaker[self.speaker_index[speaker]]
+        else:
+            return np.empty(0, dtype=np.int64)
+        # Both bounds are binary searches; only the returned slice is touched after that
+        low = 0 if start is None else int(np.searchsorted(max_ends, start, side="right"))
+        high = len(starts) if end is None else int(np.searchsorted(starts, end, side="left"))
+        rows = np.arange(low, max(low, high)) if rows is None else rows[low:high]
+        if start is not None:
+            rows = rows[self.ends[rows] > start]
+        return rows
+
+    def query(self, start=None, end=None, speaker=None):
+        return [self.turn(row) for row in self.rows(start, end, speaker)]
+
+class TranscriptStore:
+    def __init__(self, max_items=TRANSCRIPT_STORE_SIZE):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, transcript):
+        transcript_id = uuid.uuid4().hex
+        with self.lock:
+            self.items[transcript_id] = transcript
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+        return transcript_id
+
+    def get(self, transcript_id):
+        with self.lock:
+            transcript = self.items.get(transcript_id)
+            if transcript is not None:
+                self.items.move_to_end(transcript_id)
+            return transcript
@@ -1,35 +1,39 @@
 import torch
 import logging
 import gradio as gr
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-import whisper
+from translation_engine import load_translator
+from asr_backend import load_asr_backend
 import os
+from translation_stage import translate_transcription, translation_memory
+from audio_ingest import decode_file
+from vad import transcribe_speech_only
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Load Whisper model for transcription
-whisper_model = whisper.load_model("tiny")
+whisper_model = load_asr_backend("tiny")
 
-# Setup translation pipeline using Hugging Face's transformers library
+# Setup translation with the configured engine (transformers pipeline or CTranslate2 int8)
 model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-translator = pipeline("translation", model=model, tokenizer=tokenizer)
+translator = load_translator(model_name)
 
-def transcribe_and_translate(audio_file):
+def transcribe_and_translate(audio_file, use_vad=False):
     try:
-        # Transcribe audio using Whisper model
-        transcription_result = whisper_model.transcribe(audio_file)
-
-        # Extract transcription text
-        transcription_text = transcription_result['text']
+        # Transcribe audio using Whisper model, optionally only the speech regions found by VAD
+        if use_vad:
+            transcription_result = transcribe_speech_only(whisper_model, decode_file(audio_file))
+            vad_stats = transcription_result["vad"]
+            logging.info(f"VAD skipped {vad_stats['skipped_seconds']}s of {vad_stats['audio_seconds']}s.")
+        else:
+            transcription_result = whisper_model.transcribe(audio_file)
 
-        # Translate from Hindi to English
-        translation_result = translator(transcription_text, max_length=400)
+        # Translate from Hindi to English sentence by sentence, in batches
+        translated_text = translate_transcription(translator, transcription_result)
+        logging.info(f"Translation memory: {translation_memory.stats()}")
 
-        # Extract and return translated text
-        translated_text = translation_result[0]['translation_text']
+        if use_vad:
+            translated_text += f"\n\n[Skipped {vad_stats['skipped_seconds']}s of silence out of {vad_stats['audio_seconds']}s]"
         
         return translated_text
 
@@ -38,10 +42,10 @@ def transcribe_and_translate(audio_file):
         return "Transcription and translation failed."
 
 # Define Gradio interface function
-def gradio_interface(audio_file):
+def gradio_interface(audio_file, use_vad):
     try:
         # Perform transcription and translation
-        translation = transcribe_and_translate(audio_file.name)  # audio_file is a File object from Gradio
+        translation = transcribe_and_translate(audio_file.name, use_vad)  # audio_file is a File object from Gradio
 
         # Return translation result
         if translation:
@@ -54,7 +58,7 @@ def gradio_interface(audio_file):
         return "An error occurred during transcription and translation."
 
 # Gradio interface setup
-inputs = gr.File(label="Upload Audio File")
+inputs = [gr.File(label="Upload Audio File"), gr.Checkbox(label="Skip silence (VAD)", value=False)]
 output = gr.Textbox(label="Translation Result")
 
 # Launch Gradio interface
@@ -0,0 +1,82 @@
+import argparse
+import gc
+import logging
+import math
+import re
+import time
+from collections import Counter
+from translation_engine import load_translator
+
+# Compare translation engines on a local Hindi -> English fixture (tab separated: source, reference).
+#
+#   python translation_benchmark.py --engines transformers ctranslate2 --repeat 5
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+model_name = "Helsinki-NLP/opus-mt-hi-en"  # Hindi to English translation model
+
+def tokenize(text):
+    return re.findall(r"\w+|[^\w\s]", text.lower())
+
+def corpus_bleu(hypotheses, references, max_order=4):
+    # Corpus-level BLEU with brevity penalty over lowercased word/punctuation tokens
+    matches = [0] * max_order
+    totals = [0] * max_order
+    hypothesis_length = reference_length = 0
+    for hypothesis, reference in zip(hypotheses, references):
+        hypothesis, reference = tokenize(hypothesis), tokenize(reference)
+        hypothesis_length += len(hypothesis)
+        reference_length += len(reference)
+        for n in range(1, max_order + 1):
+            hypothesis_ngrams = Counter(tuple(hypothesis[i:i + n]) for i in range(len(hypothesis) - n + 1))
+            reference_ngrams = Counter(tuple(reference[i:i + n]) for i in range(len(reference) - n + 1))
+            matches[n - 1] += sum((hypothesis_ngrams & reference_ngrams).values())
+            totals[n - 1] += max(0, len(hypothesis) - n + 1)
+    if not hypothesis_length or min(matches) == 0:
+        return 0.0
+    log_precision = sum(math.log(match / total) for match, total in zip(matches, totals)) / max_order
+    brevity_penalty = min(0.0, 1 - reference_length / hypothesis_length)
+    return 100 * math.exp(log_precision + brevity_penalty)
+
+def load_fixture(path):
+    sources, references = [], []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                source, reference = line.rstrip("\n").split("\t")
+                sources.append(source)
+                references.append(reference)
+    return sources, references
+
+def benchmark(engine, sources, references, batch_size, repeat):
+    translator = load_translator(model_name, engine)
+    # Untimed warm-up pass
+    translator(sources[:batch_size], batch_size=batch_size, max_length=400)
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        results = translator(sources, batch_size=batch_size, max_length=400)
+    elapsed = time.perf_counter() - start_time
+
+    hypotheses = [result["translation_text"] for result in results]
+    del translator
+    gc.collect()
+    return len(sources) * repeat / elapsed, corpus_bleu(hypotheses, references)
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and BLEU of the opus-mt-hi-en translation engines")
+    parser.add_argument("--fixture", default="fixtures/hi_en_sentences.tsv")
+    parser.add_argument("--engines", nargs="+", default=["transformers", "ctranslate2"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sources, references = load_fixture(args.fixture)
+    rows = [(engine, *benchmark(engine, sources, references, args.batch_size, args.repeat)) for engine in args.engines]
+
+    print(f"\n{'engine':<16}{'sent/s':>10}{'BLEU':>8}")
+    for engine, throughput, bleu in rows:
+        print(f"{engine:<16}{throughput:>10.1f}{bleu:>8.1f}")
+
+if __name__ == "__main__":
+    main()
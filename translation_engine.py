@@ -0,0 +1,69 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+
+# Which runtime translates: "transformers" (PyTorch float32 pipeline) or "ctranslate2" (int8 on CPU)
+TRANSLATION_ENGINE = os.environ.get("TRANSLATION_ENGINE", "transformers")
+TRANSLATION_COMPUTE_TYPE = os.environ.get("TRANSLATION_COMPUTE_TYPE", "int8")
+# Converted CTranslate2 models are written here on first use
+CT2_MODEL_ROOT = os.environ.get("CT2_MODEL_ROOT", "ct2_models")
+# Marian's generation config for opus-mt uses 4 beams
+TRANSLATION_BEAM_SIZE = int(os.environ.get("TRANSLATION_BEAM_SIZE", "4"))
+
+def convert_model(ctranslate2, model_name, model_dir, compute_type):
+    # Pool workers start together: each converts into its own temporary directory next to the target and
+    # renames it into place, so a killed or concurrent conversion never leaves a half-written model_dir
+    os.makedirs(CT2_MODEL_ROOT, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(model_dir) + ".tmp-", dir=CT2_MODEL_ROOT)
+    try:
+        logging.info(f"Converting {model_name} to CTranslate2 ({compute_type}) in {model_dir}.")
+        ctranslate2.converters.TransformersConverter(model_name).convert(tmp_dir, quantization=compute_type, force=True)
+        if os.path.isdir(model_dir) and not os.path.exists(os.path.join(model_dir, "model.bin")):
+            # Left over from an interrupted conversion before conversions were atomic
+            shutil.rmtree(model_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, model_dir)
+        except OSError:
+            # Another worker finished first; its copy is complete, so use that one
+            if not os.path.exists(os.path.join(model_dir, "model.bin")):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+class CTranslate2Translator:
+    # Drop-in for the transformers translation pipeline: same call signature and result shape
+    def __init__(self, model_name, compute_type=TRANSLATION_COMPUTE_TYPE):
+        import ctranslate2
+        model_dir = os.path.join(CT2_MODEL_ROOT, f"{model_name.replace('/', '--')}-{compute_type}")
+        if not os.path.exists(os.path.join(model_dir, "model.bin")):
+            convert_model(ctranslate2, model_name, model_dir, compute_type)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.translator = ctranslate2.Translator(model_dir, device="cpu", compute_type=compute_type)
+
+    def __call__(self, texts, batch_size=16, max_length=400, truncation=True, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        sources = [self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text, truncation=truncation, max_length=512)) for text in texts]
+        results = self.translator.translate_batch(sources, max_batch_size=batch_size, max_decoding_length=max_length, beam_size=TRANSLATION_BEAM_SIZE)
+        return [
+            {"translation_text": self.tokenizer.decode(self.tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True)}
+            for result in results
+        ]
+
+def load_translator(model_name, engine=None):
+    engine = engine or TRANSLATION_ENGINE
+    start_time = time.time()
+    if engine == "ctranslate2":
+        translator = CTranslate2Translator(model_name)
+    elif engine == "transformers":
+        # Setup translation pipeline using Hugging Face's transformers library
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        translator = pipeline("translation", model=model, tokenizer=tokenizer)
+    else:
+        raise ValueError(f"Unknown translation engine {engine!r}, expected transformers or ctranslate2")
+    logging.info(f"Loaded {model_name} with {engine} in {time.time() - start_time:.1f} seconds.")
+    return translator
@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Sentences sent through the translator per padded batch
+TRANSLATION_BATCH_SIZE = int(os.environ.get("TRANSLATION_BATCH_SIZE", "16"))
+# Distinct sentences remembered by the translation memory
+TRANSLATION_MEMORY_SIZE = int(os.environ.get("TRANSLATION_MEMORY_SIZE", "20000"))
+# Longer pieces are split on whitespace so they fit the Marian 512 token window
+MAX_PIECE_CHARS = 300
+
+# Sentence ends: Devanagari danda / double danda and Latin punctuation
+SENTENCE_END = re.compile(r"(?<=[।॥.!?])\s+")
+
+def split_long(piece):
+    if len(piece) <= MAX_PIECE_CHARS:
+        return [piece]
+    parts, current = [], ""
+    for word in piece.split():
+        if current and len(current) + 1 + len(word) > MAX_PIECE_CHARS:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+def split_sentences(text):
+    pieces = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if sentence:
+            pieces.extend(split_long(sentence))
+    return pieces
+
+def transcription_pieces(transcription_result):
+    # Prefer Whisper's own segments, split further at sentence boundaries
+    segments = transcription_result.get("segments") or []
+    if not segments:
+        return split_sentences(transcription_result.get("text", ""))
+    pieces = []
+    for segment in segments:
+        pieces.extend(split_sentences(segment["text"]))
+    return pieces
+
+def normalize_sentence(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class TranslationMemory:
+    # Bounded LRU of normalized source sentence -> translation
+    def __init__(self, max_entries=TRANSLATION_MEMORY_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, sentences):
+        found = {}
+        with self.lock:
+            for sentence in sentences:
+                translation = self.entries.get(sentence)
+                if translation is None:
+                    self.misses += 1
+                else:
+                    self.entries.move_to_end(sentence)
+                    self.hits += 1
+                    found[sentence] = translation
+        return found
+
+    def store(self, translations):
+        with self.lock:
+            for sentence, translation in translations.items():
+                self.entries[sentence] = translation
+                self.entries.move_to_end(sentence)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+translation_memory = TranslationMemory()
+
+def run_translator(translator, texts, batch_size, max_length):
+    # Translates in padded batches; sorting by length keeps padding low, results come back in input order
+    translations = [""] * len(texts)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        results = translator([texts[i] for i in batch], batch_size=len(batch), max_length=max_length, truncation=True)
+        for i, result in zip(batch, results):
+            translations[i] = result["translation_text"]
+    return translations
+
+def translate_texts(translator, texts, batch_size=TRANSLATION_BATCH_SIZE, max_length=400, memory=translation_memory):
+    normalized = [normalize_sentence(text) for text in texts]
+    unique = list(dict.fromkeys(sentence for sentence in normalized if sentence))
+    known = memory.lookup(unique) if memory is not None else {}
+
+    # Only sentences the memory has not seen reach the model
+    misses = [sentence for sentence in unique if sentence not in known]
+    if misses:
+        fresh = dict(zip(misses, run_translator(translator, misses, batch_size, max_length)))
+        if memory is not None:
+            memory.store(fresh)
+        known.update(fresh)
+
+    return [known.get(sentence, "") for sentence in normalized]
+
+def translate_transcription(translator, transcription_result, batch_size=TRANSLATION_BATCH_SIZE, memory=translation_memory):
+    pieces = transcription_pieces(transcription_result)
+    return " ".join(text for text in translate_texts(translator, pieces, batch_size, memory=memory) if text)
@@ -1,8 +1,9 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Request
 from fastapi.responses import HTMLResponse
 from bark import SAMPLE_RATE, generate_audio, preload_models
 from scipy.io.wavfile import write as write_wav
 import uvicorn
+from static_assets import StaticAssets
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -26,8 +27,7 @@ class CustomTextToSpeechPipeline:
 # Initialize the custom pipeline
 synthesiser = CustomTextToSpeechPipeline()
 
-@app.get("/", response_class=HTMLResponse)
-async def get_root():
+def index_page():
     return """
     <!DOCTYPE html>
     <html lang="en">
@@ -167,6 +167,14 @@ async def get_root():
     </html>
     """
 
+# The page is compressed once and revalidated with its ETag instead of being re-sent
+static_assets = StaticAssets()
+static_assets.add_page("index.html", index_page())
+
+@app.get("/", response_class=HTMLResponse)
+async def get_root(request: Request):
+    return static_assets.response(request, "index.html")
+
 @app.post("/synthesize")
 async def synthesize_text(request: dict):
     try:
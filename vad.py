@@ -0,0 +1,100 @@
+import bisect
+import logging
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Frames this far above the recording's noise floor count as speech
+SPEECH_MARGIN_DB = 12.0
+# Anything quieter than this is silence no matter how quiet the floor is
+MIN_SPEECH_DB = -55.0
+MIN_SPEECH_S = 0.25
+MIN_SILENCE_S = 0.6
+PAD_S = 0.2
+
+def frame_energy_db(audio, frame_length):
+    frame_count = len(audio) // frame_length
+    frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+    return 10 * np.log10(np.mean(frames.astype(np.float32) ** 2, axis=1) + 1e-10)
+
+def speech_regions(audio, sample_rate=SAMPLE_RATE, min_speech_s=MIN_SPEECH_S, min_silence_s=MIN_SILENCE_S, pad_s=PAD_S):
+    # Returns (start, end) sample ranges that contain speech, using an adaptive energy threshold
+    frame_length = int(sample_rate * FRAME_MS / 1000)
+    if len(audio) < frame_length:
+        return [(0, len(audio))] if len(audio) else []
+
+    energy = frame_energy_db(audio, frame_length)
+    noise_floor = np.percentile(energy, 10)
+    voiced = energy > max(noise_floor + SPEECH_MARGIN_DB, MIN_SPEECH_DB)
+
+    # Run boundaries of the voiced mask, as frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+
+    max_gap = int(min_silence_s * 1000 / FRAME_MS)
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    min_frames = int(min_speech_s * 1000 / FRAME_MS)
+    pad = int(pad_s * sample_rate)
+    regions = []
+    for start, end in merged:
+        if end - start < min_frames:
+            continue
+        start_sample = max(0, start * frame_length - pad)
+        end_sample = min(len(audio), end * frame_length + pad)
+        if regions and start_sample <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end_sample)
+        else:
+            regions.append((start_sample, end_sample))
+    return regions
+
+class Timeline:
+    # Maps times on the trimmed (speech-only) audio back to the original recording
+    def __init__(self, regions, sample_rate=SAMPLE_RATE):
+        self.trimmed_starts = []
+        self.original_starts = []
+        position = 0
+        for start, end in regions:
+            self.trimmed_starts.append(position / sample_rate)
+            self.original_starts.append(start / sample_rate)
+            position += end - start
+
+    def to_original(self, seconds):
+        index = max(0, bisect.bisect_right(self.trimmed_starts, seconds) - 1)
+        return self.original_starts[index] + seconds - self.trimmed_starts[index]
+
+def transcribe_speech_only(model, audio, sample_rate=SAMPLE_RATE, **transcribe_kwargs):
+    # Transcribes only the speech regions and reports how much audio was skipped
+    regions = speech_regions(audio, sample_rate)
+    total_seconds = len(audio) / sample_rate
+    speech_seconds = sum(end - start for start, end in regions) / sample_rate
+    stats = {
+        "regions": len(regions),
+        "audio_seconds": round(total_seconds, 2),
+        "speech_seconds": round(speech_seconds, 2),
+        "skipped_seconds": round(total_seconds - speech_seconds, 2),
+    }
+    logging.info(f"VAD kept {speech_seconds:.1f}s of {total_seconds:.1f}s in {len(regions)} region(s).")
+    # Speech regions in seconds, so sharded runs can count speech only inside each shard's own range
+    speech_regions_s = [(start / sample_rate, end / sample_rate) for start, end in regions]
+    if not regions:
+        return {"text": "", "segments": [], "vad": stats, "speech_regions": speech_regions_s}
+
+    trimmed = np.concatenate([audio[start:end] for start, end in regions]).astype(np.float32)
+    result = model.transcribe(trimmed, **transcribe_kwargs)
+
+    timeline = Timeline(regions, sample_rate)
+    for segment in result.get("segments", []):
+        segment["start"] = timeline.to_original(segment["start"])
+        segment["end"] = timeline.to_original(segment["end"])
+        for word in segment.get("words") or []:
+            word["start"] = timeline.to_original(word["start"])
+            word["end"] = timeline.to_original(word["end"])
+    result["vad"] = stats
+    result["speech_regions"] = speech_regions_s
+    return result
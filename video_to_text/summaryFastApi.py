@@ -1,54 +1,65 @@
 # main.py
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request
 from fastapi.responses import HTMLResponse
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
 import speech_recognition as sr
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from transformers import pipeline
+import asyncio
 import os
+import sys
 import uvicorn
 
+# Shared helpers (static assets, audio decoding, ...) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from static_assets import StaticAssets
+from audio_ingest import iter_pcm_chunks, SAMPLE_RATE, READ_SIZE
+from scratch_space import scratch_workspace, safe_suffix
+from worker_pool import WorkerPool, QueueFullError, busy_response
+from summarizer_model import SummarizerHolder, SUMMARIZER_LOAD
+
 app = FastAPI()
 
-# Extract Audio from Video
-def extract_audio(video_path, audio_path):
-    video = VideoFileClip(video_path)
-    video.audio.write_audiofile(audio_path)
+# Videos summarized at once; further uploads wait in a bounded queue, beyond that they get a 503
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "4"))
+worker_pool = WorkerPool(max_workers=MAX_CONCURRENT_JOBS, max_queue=JOB_QUEUE_SIZE, use_processes=False)
+# BART is loaded once per process and shared by every job
+summarizer = SummarizerHolder()
+
+@app.on_event("startup")
+async def load_summarizer():
+    if SUMMARIZER_LOAD == "startup":
+        await asyncio.to_thread(summarizer.get)
 
-# Transcribe Audio to Text with Chunking
+# Chunks being recognized at once; at most twice this many 60 s PCM chunks are held in memory
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "8"))
+
+# Transcribe one chunk of 16-bit mono PCM, handed over in memory
 def transcribe_chunk(chunk):
     recognizer = sr.Recognizer()
-    with sr.AudioFile(chunk) as source:
-        audio = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio)
-        except sr.UnknownValueError:
-            text = ""
+    audio = sr.AudioData(chunk, SAMPLE_RATE, 2)
+    try:
+        text = recognizer.recognize_google(audio)
+    except sr.UnknownValueError:
+        text = ""
     return text
 
-def transcribe_audio(audio_path, chunk_length_ms=60000):
-    audio = AudioSegment.from_wav(audio_path)
-    chunks = [audio[i:i + chunk_length_ms] for i in range(0, len(audio), chunk_length_ms)]
-
-    chunk_files = []
-    for i, chunk in enumerate(chunks):
-        chunk_path = f"temp_chunk_{i}.wav"
-        chunk.export(chunk_path, format="wav")
-        chunk_files.append(chunk_path)
-
-    with ThreadPoolExecutor() as executor:
-        transcriptions = list(executor.map(transcribe_chunk, chunk_files))
-
-    # Cleanup temp chunk files
-    for chunk_file in chunk_files:
-        os.remove(chunk_file)
+# Transcribe Audio to Text with Chunking: ffmpeg decodes the video's audio track straight into memory
+def transcribe_audio(video_path, chunk_length_s=60):
+    transcriptions = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+        for chunk in iter_pcm_chunks(video_path, chunk_length_s):
+            # Decoding runs ahead of recognition by a bounded number of chunks
+            if len(pending) >= 2 * CHUNK_WORKERS:
+                transcriptions.append(pending.popleft().result())
+            pending.append(executor.submit(transcribe_chunk, chunk))
+        transcriptions.extend(future.result() for future in pending)
 
     return " ".join(transcriptions)
 
 # Summarize the Text with Adjustable Length
 def summarize_text(text, max_length, min_length):
-    summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
     summary = summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
     return summary[0]['summary_text']
 
@@ -66,38 +77,45 @@ def summarize_long_text(text, length_ratio=1):
 
 # Generate Video Summary
 def generate_video_summary(video_path):
-    # Paths
-    audio_path = "temp_audio.wav"
-
-    # Extract audio from video
-    extract_audio(video_path, audio_path)
-
-    # Transcribe audio to text
-    text = transcribe_audio(audio_path)
+    # Transcribe the video's audio to text
+    text = transcribe_audio(video_path)
 
     # Summarize the text
     summary = summarize_long_text(text)
 
-    # Cleanup temp audio file
-    os.remove(audio_path)
-
     return summary
 
 @app.post("/upload-video/")
 async def upload_video(file: UploadFile = File(...)):
-    video_path = f"temp_video_{file.filename}"
-    with open(video_path, "wb") as buffer:
-        buffer.write(await file.read())
+    # Refuse before copying the upload into scratch space (tmpfs, i.e. RAM, by default) when the queue is full
+    try:
+        worker_pool.check_capacity()
+    except QueueFullError as e:
+        return busy_response(e)
+
+    # Every upload gets its own scratch directory, so concurrent jobs never share a path
+    with scratch_workspace("video-") as workspace:
+        video_path = os.path.join(workspace, "video" + safe_suffix(file.filename, ".mp4"))
+        with open(video_path, "wb") as buffer:
+            while chunk := await file.read(READ_SIZE):
+                buffer.write(chunk)
 
-    summary = generate_video_summary(video_path)
-
-    # Cleanup temp video file
-    os.remove(video_path)
+        try:
+            summary = await worker_pool.run(generate_video_summary, video_path)
+        except QueueFullError as e:
+            return busy_response(e)
 
     return {"summary": summary}
 
-@app.get("/")
-async def main():
+@app.get("/queue")
+async def queue_status():
+    return worker_pool.stats()
+
+@app.get("/status")
+async def model_status():
+    return {"summarizer": summarizer.status(), "queue": worker_pool.stats()}
+
+def index_page():
     content = """
     <!DOCTYPE html>
     <html lang="en">
@@ -246,7 +264,15 @@ async def main():
     </body>
     </html>
     """
-    return HTMLResponse(content=content)
+    return content
+
+# The page is compressed once and revalidated with its ETag instead of being re-sent
+static_assets = StaticAssets()
+static_assets.add_page("index.html", index_page())
+
+@app.get("/", response_class=HTMLResponse)
+async def main(request: Request):
+    return static_assets.response(request, "index.html")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
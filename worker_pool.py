@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi.responses import JSONResponse
+
+# Defaults for the bounded worker pools used by the speech apps
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "2"))
+WORKER_QUEUE_SIZE = int(os.environ.get("WORKER_QUEUE_SIZE", "8"))
+# Items a streaming job may get ahead of its reader before it pauses
+STREAM_CHANNEL_SIZE = int(os.environ.get("STREAM_CHANNEL_SIZE", "32"))
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Worker queue is full, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+def timed_call(fn, args, kwargs):
+    # Runs inside the worker so the start time reflects when the job left the queue
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+def noop():
+    return os.getpid()
+
+def put_unless_cancelled(channel, item, cancel):
+    # A full channel means the reader is slow or gone: wait, but give up once it cancels
+    while not cancel.is_set():
+        try:
+            channel.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def pump_generator(fn, args, kwargs, channel, cancel):
+    # Runs a generator inside the worker and forwards each item to the web process
+    items = fn(*args, **kwargs)
+    try:
+        for item in items:
+            if not put_unless_cancelled(channel, ("item", item), cancel):
+                logging.info("Streaming job cancelled by its reader.")
+                return
+        put_unless_cancelled(channel, ("end", None), cancel)
+    except Exception as e:
+        logging.error(f"Streaming job failed: {e}")
+        put_unless_cancelled(channel, ("error", str(e)), cancel)
+    finally:
+        # Runs the generator's own cleanup (e.g. stopping its producer thread) when it is abandoned
+        items.close()
+
+class StreamError(Exception):
+    pass
+
+class WorkerPool:
+    # Runs blocking inference in worker processes (each holding its own models) behind a bounded queue
+    def __init__(self, initializer=None, initargs=(), max_workers=WORKER_PROCESSES, max_queue=WORKER_QUEUE_SIZE, use_processes=True):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        if use_processes:
+            # spawn rather than fork so torch and the event loop threads are not copied into workers
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=initializer, initargs=initargs)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        self.manager = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.avg_wait_s = 0.0
+        self.avg_run_s = 0.0
+
+    def start(self):
+        # Bring every worker up (and load its models) before the first request arrives
+        pids = [self.executor.submit(noop) for _ in range(self.max_workers)]
+        return [pid.result() for pid in pids]
+
+    def queue_depth(self):
+        return max(0, self.in_flight - self.max_workers)
+
+    def retry_after(self):
+        backlog = self.queue_depth() + 1
+        return max(1, math.ceil(self.avg_run_s * backlog / self.max_workers))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth(),
+                "queue_capacity": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_s": round(self.avg_wait_s, 3),
+                "avg_run_s": round(self.avg_run_s, 3),
+            }
+
+    def record(self, submitted, future):
+        with self.lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            started, finished, _ = future.result()
+            self.completed += 1
+            # Exponentially weighted so the estimates follow the current load
+            self.avg_wait_s += 0.2 * (max(0.0, started - submitted) - self.avg_wait_s)
+            self.avg_run_s += 0.2 * (max(0.0, finished - started) - self.avg_run_s)
+
+    def check_capacity(self):
+        # Early rejection, before a caller spends time or memory (e.g. storing an upload) on a job submit would refuse
+        with self.lock:
+            if self.queue_depth() >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(self.retry_after())
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            if self.queue_depth() >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(self.retry_after())
+            self.in_flight += 1
+        submitted = time.time()
+        try:
+            future = self.executor.submit(timed_call, fn, args, kwargs)
+        except Exception:
+            with self.lock:
+                self.in_flight -= 1
+            raise
+        future.add_done_callback(lambda done: self.record(submitted, done))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        _, _, result = await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+        return result
+
+    def get_manager(self):
+        with self.lock:
+            if self.manager is None:
+                self.manager = multiprocessing.get_context("spawn").Manager()
+        return self.manager
+
+    def channel(self, maxsize=STREAM_CHANNEL_SIZE):
+        if not self.use_processes:
+            return queue.Queue(maxsize=maxsize)
+        return self.get_manager().Queue(maxsize=maxsize)
+
+    def cancel_flag(self):
+        if not self.use_processes:
+            return threading.Event()
+        return self.get_manager().Event()
+
+    async def stream(self, fn, *args, **kwargs):
+        # Async iterator over the items a generator function yields in a worker
+        channel = self.channel()
+        cancel = self.cancel_flag()
+        future = self.submit(pump_generator, fn, args, kwargs, channel, cancel)
+        try:
+            while True:
+                try:
+                    kind, value = await asyncio.to_thread(channel.get, True, 1.0)
+                except queue.Empty:
+                    # A worker that died never reports through the channel
+                    if future.done() and future.exception() is not None:
+                        raise StreamError(str(future.exception()))
+                    continue
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise StreamError(value)
+                yield value
+        finally:
+            # Reached when the reader finishes, fails or is closed early (e.g. the client disconnected);
+            # the worker stops at its next item and frees its slot
+            cancel.set()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+def busy_response(error):
+    logging.warning(str(error))
+    return JSONResponse(
+        content={"detail": "Server is busy, please retry later.", "retry_after": error.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(error.retry_after)},
+    )